@@ -49,12 +49,18 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.routers.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'Stocker.urls'
 
+# permission sets are cached across requests, see main/auth.py
+AUTHENTICATION_BACKENDS = [
+    'main.auth.CachedPermissionBackend',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -66,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.caching.fragments',
             ],
         },
     },
@@ -79,11 +86,104 @@ WSGI_APPLICATION = 'Stocker.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': os.environ.get("DB_ENGINE", 'django.db.backends.sqlite3'),
+        'NAME': os.environ.get("DB_NAME", BASE_DIR / 'db.sqlite3'),
+        'USER': os.environ.get("DB_USER", ""),
+        'PASSWORD': os.environ.get("DB_PASSWORD", ""),
+        'HOST': os.environ.get("DB_HOST", ""),
+        'PORT': os.environ.get("DB_PORT", ""),
     }
 }
 
+# DB_PROFILE=production turns on WAL journaling, tuned pragmas (applied in main/db.py) and persistent connections
+DB_PROFILE = os.environ.get("DB_PROFILE", "development")
+
+SQLITE_PRAGMAS = {}
+if DB_PROFILE == "production":
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),
+        "temp_store": "MEMORY",
+    }
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get("CONN_MAX_AGE", 600))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES['default']['OPTIONS'] = {
+            'timeout': SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        }
+
+# read-only pages read from the replica when one is configured, see main/routers.py.
+# locally two SQLite files work: DB_REPLICA_NAME=replica.sqlite3 next to a copy of db.sqlite3
+if os.environ.get("DB_REPLICA_NAME") or os.environ.get("DB_REPLICA_HOST"):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get("DB_REPLICA_NAME", DATABASES['default']['NAME']),
+        'HOST': os.environ.get("DB_REPLICA_HOST", DATABASES['default']['HOST']),
+        'PORT': os.environ.get("DB_REPLICA_PORT", DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+
+# seconds a session keeps reading from the primary after it wrote, so users see their own changes
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 30))
+
+
+# Cache
+# CACHE_BACKEND is locmem (per process), file, redis or a dotted backend path. The bundled backends count hits and misses,
+# use file or redis when several processes serve the site so invalidations are shared
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+CACHE_BACKENDS = {
+    "locmem": ("main.caching.LocMemCache", "stocker"),
+    "file": ("main.caching.FileBasedCache", str(BASE_DIR / ".cache")),
+    "redis": ("main.caching.RedisCache", "redis://127.0.0.1:6379/1"),
+}
+cache_backend, cache_location = CACHE_BACKENDS.get(CACHE_BACKEND, (CACHE_BACKEND, ""))
+CACHES = {
+    'default': {
+        'BACKEND': cache_backend,
+        'LOCATION': os.environ.get("CACHE_LOCATION", cache_location),
+        'TIMEOUT': int(os.environ.get("CACHE_TIMEOUT", 300)),
+    }
+}
+if CACHE_BACKEND in ("locmem", "file"):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get("CACHE_MAX_ENTRIES", 5000))}
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get("FRAGMENT_CACHE_TIMEOUT", 600))
+
+
+# Profiling
+# PROFILING=1 adds main.profiling.ProfilingMiddleware: every sampled request is written as a JSON line to PROFILING_LOG
+# and gets a Server-Timing header, summarise the log with manage.py profiling_report
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILING_LOG = os.environ.get("PROFILING_LOG", str(BASE_DIR / "profiling.log"))
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 1))
+# tracemalloc slows every allocation down, PROFILING_MEMORY=0 keeps the timings closer to production
+PROFILING_MEMORY = os.environ.get("PROFILING_MEMORY", "1") == "1"
+# a statement run this many times in one request is reported as a likely N+1
+PROFILING_REPEAT_THRESHOLD = int(os.environ.get("PROFILING_REPEAT_THRESHOLD", 5))
+if PROFILING:
+    MIDDLEWARE.insert(0, 'main.profiling.ProfilingMiddleware')
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'message': {'format': '%(message)s'},
+        },
+        'handlers': {
+            'profiling': {
+                'class': 'logging.FileHandler',
+                'filename': PROFILING_LOG,
+                'formatter': 'message',
+                'delay': True,
+            },
+        },
+        'loggers': {
+            'stocker.profiling': {'handlers': ['profiling'], 'level': 'INFO', 'propagate': False},
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -122,6 +222,17 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# uploads are stored under their content hash and shared between rows, see main/storage.py
+STORAGES = {
+    "default": {
+        "BACKEND": "main.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -134,4 +245,14 @@ EMAIL_PORT= 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Notifications
+# alerts are queued in the outbox and delivered by `manage.py send_notifications`
+# or batched per manager by `manage.py send_alert_digest`
+
+EXPIRY_ALERT_DAYS = int(os.environ.get("EXPIRY_ALERT_DAYS", 10))
+LOW_STOCK_THRESHOLD = int(os.environ.get("LOW_STOCK_THRESHOLD", 100))
+ALERT_DIGEST_WINDOW_MINUTES = float(os.environ.get("ALERT_DIGEST_WINDOW_MINUTES", 60))
+# comma separated, falls back to the superusers' emails when empty
+ALERT_RECIPIENTS = [email.strip() for email in os.environ.get("ALERT_RECIPIENTS", "").split(",") if email.strip()]
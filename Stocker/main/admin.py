@@ -4,3 +4,23 @@ from . import models
 admin.site.register(models.Category)
 admin.site.register(models.Supplier)
 admin.site.register(models.Product)
+admin.site.register(models.Notification)
+admin.site.register(models.InventoryCounter)
+admin.site.register(models.ImportJob)
+admin.site.register(models.StockRollup)
+admin.site.register(models.RollupCursor)
+
+
+@admin.register(models.StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    # the ledger is append only
+    list_display = ("product", "kind", "delta", "stock_after", "created_by", "created_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
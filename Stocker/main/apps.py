@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import db, signals
+        connection_created.connect(db.apply_pragmas, dispatch_uid="main.apply_pragmas")
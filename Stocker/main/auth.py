@@ -0,0 +1,38 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+VERSION_KEY = "perms:version"
+CACHE_TIMEOUT = 60 * 5
+
+
+def version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def invalidate():
+    # every cached permission set goes stale at once, group and permission edits are rare
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def cache_key(user_obj):
+    # superuser status is part of the key, so saving a user doesn't need an invalidation
+    return f"perms:{version()}:{user_obj.pk}:{int(user_obj.is_superuser)}"
+
+
+class CachedPermissionBackend(ModelBackend):
+    # the user's full permission set is loaded once and shared by every request until a bump of the version
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            key = cache_key(user_obj)
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, CACHE_TIMEOUT)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
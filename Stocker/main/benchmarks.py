@@ -0,0 +1,47 @@
+import contextlib
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test.utils import override_settings
+
+# a private cache, so benchmark rows never end up in the snapshots and fragments of the running site
+BENCHMARK_CACHES = {
+    "default": {"BACKEND": "main.caching.LocMemCache", "LOCATION": "stocker-benchmark"},
+}
+
+
+@contextlib.contextmanager
+def scratch_database():
+    # benchmarks fill a throwaway test database, the configured database is never written
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(function, repeat=3):
+    # best wall time in ms over untraced runs, tracemalloc slows allocations down so the peak in KB comes from one more run
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def write_table(stdout, header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header, *rows]:
+        stdout.write("  ".join(str(value).rjust(width) for value, width in zip(row, widths)))
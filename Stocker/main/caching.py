@@ -0,0 +1,127 @@
+import hashlib
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends import filebased, locmem, redis
+from django.utils import timezone
+from django.utils.http import urlencode
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+_missing = object()
+
+# fragment groups, each with its own version key, see FRAGMENT_INVALIDATIONS in signals.py
+GROUPS = ("dashboard", "products", "categories", "suppliers")
+# groups whose rows show values relative to today, e.g. days to expiry
+DAILY_GROUPS = ("products",)
+
+
+def _namespace(key):
+    # counted per key prefix: "perms:3:7:0" as "perms", fragments as "template.cache.<fragment name>"
+    key = str(key)
+    if key.startswith("template.cache."):
+        return ".".join(key.split(".")[:3])
+    return key.split(":", 1)[0]
+
+
+def _record(key, hits, misses):
+    namespace = _namespace(key)
+    with _lock:
+        _stats[namespace]["hits"] += hits
+        _stats[namespace]["misses"] += misses
+
+
+def stats():
+    with _lock:
+        namespaces = {name: dict(values) for name, values in sorted(_stats.items())}
+    hits = sum(values["hits"] for values in namespaces.values())
+    misses = sum(values["misses"] for values in namespaces.values())
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "namespaces": namespaces,
+    }
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+class InstrumentedCacheMixin:
+    # hit/miss counters are kept per process, they are read by the cache_stats view
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        _record(key, int(value is not _missing), int(value is _missing))
+        return default if value is _missing else value
+
+
+class LocMemCache(InstrumentedCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(InstrumentedCacheMixin, filebased.FileBasedCache):
+    pass
+
+
+class RedisCache(InstrumentedCacheMixin, redis.RedisCache):
+
+    def get_many(self, keys, version=None):
+        # the base class get_many goes through get(), redis fetches all keys in one round trip instead
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        for key in keys:
+            _record(key, int(key in found), int(key not in found))
+        return found
+
+
+def version(group):
+    return cache.get_or_set(f"fragver:{group}", 1, None)
+
+
+def invalidate(*groups):
+    # cached fragments are never deleted one by one, bumping the version makes every old key unreachable
+    for group in groups:
+        try:
+            cache.incr(f"fragver:{group}")
+        except ValueError:
+            cache.set(f"fragver:{group}", 2, None)
+
+
+def permission_key(user):
+    if not user.is_authenticated:
+        return "anonymous"
+    permissions = ",".join(sorted(user.get_all_permissions()))
+    return hashlib.md5(permissions.encode()).hexdigest()[:12]
+
+
+def fragment_key(request, group):
+    # the path is part of the key, several views render the same template, e.g. suppliers/home.html
+    query = request.path + "?" + urlencode(sorted(request.GET.lists()), doseq=True)
+    parts = [str(version(group)), permission_key(request.user), hashlib.md5(query.encode()).hexdigest()[:12]]
+    if group in DAILY_GROUPS:
+        parts.append(timezone.localtime().date().isoformat())
+    return ":".join(parts)
+
+
+class FragmentKeys:
+    # {% cache fragment_timeout products_list fragment_keys.products %}, computed only for the groups a template uses
+
+    def __init__(self, request):
+        self.request = request
+
+    def __getitem__(self, group):
+        if group not in GROUPS:
+            raise KeyError(group)
+        return fragment_key(self.request, group)
+
+
+def fragments(request):
+    return {
+        "fragment_keys": FragmentKeys(request),
+        "fragment_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
+    }
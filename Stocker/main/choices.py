@@ -0,0 +1,64 @@
+import hashlib
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from . import caching, models, search
+
+CHOICE_CACHE_TIMEOUT = 3600
+TYPEAHEAD_LIMIT = 20
+# options rendered with the form, so it can be filled in without javascript
+OPTION_LIMIT = 500
+
+# typeahead sources: model, label field and the full text search over it
+SOURCES = {
+    "categories": (models.Category, "title", search.search_categories),
+    "suppliers": (models.Supplier, "name", search.search_suppliers),
+}
+
+
+def _version(kind):
+    # versioned like the template fragments, bumped by the signals in signals.py
+    return caching.version(f"{kind}_choices")
+
+
+def invalidate(kind):
+    caching.invalidate(f"{kind}_choices")
+
+
+def group_choices():
+    # groups are few but read on every user form, the list is cached until a group changes
+    key = f"choices:groups:{_version('groups')}"
+    return cache.get_or_set(
+        key, lambda: list(Group.objects.order_by("name").values_list("id", "name")), CHOICE_CACHE_TIMEOUT
+    )
+
+
+def selected(kind, ids):
+    # only the options already chosen are rendered with the page, the rest come from the typeahead
+    model, label, search_function = SOURCES[kind]
+    ids = [int(pk) for pk in ids if str(pk).isdigit()]
+    if not ids:
+        return []
+    return list(model.objects.filter(pk__in=ids).order_by(label, "id").values_list("id", label))
+
+
+def typeahead(kind, term, limit=TYPEAHEAD_LIMIT):
+    model, label, search_function = SOURCES[kind]
+    term = term.strip()[:100]
+    key = f"choices:{kind}:{_version(kind)}:{limit}:" + hashlib.md5(term.encode()).hexdigest()
+
+    def load():
+        if term:
+            queryset = search_function(model.objects.all(), term)
+        else:
+            queryset = model.objects.order_by(label, "id")
+        return [{"id": pk, "label": text} for pk, text in queryset.values_list("id", label)[:limit]]
+
+    return cache.get_or_set(key, load, CHOICE_CACHE_TIMEOUT)
+
+
+def options(kind, ids):
+    # the first OPTION_LIMIT options besides the chosen ones, the typeahead finds the rest
+    chosen = {int(pk) for pk in ids if str(pk).isdigit()}
+    return [(item["id"], item["label"]) for item in typeahead(kind, "", OPTION_LIMIT) if item["id"] not in chosen]
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Q
+
+from . import models
+
+PRODUCTS = "products"
+IN_STOCK = "in_stock"
+LOW_STOCK = "low_stock"
+OUT_OF_STOCK = "out_of_stock"
+CATEGORIES = "categories"
+SUPPLIERS = "suppliers"
+USERS = "users"
+
+NAMES = [PRODUCTS, IN_STOCK, LOW_STOCK, OUT_OF_STOCK, CATEGORIES, SUPPLIERS, USERS]
+
+
+def is_low_stock(stock):
+    # the one definition of low stock, shared by the alerts, the counters, the dashboard and the stock filter
+    return int(stock) < settings.LOW_STOCK_THRESHOLD
+
+
+def low_stock_filter():
+    return Q(stock__lt=settings.LOW_STOCK_THRESHOLD)
+
+
+def stock_bands(stock):
+    stock = int(stock)
+    bands = []
+    if stock > settings.LOW_STOCK_THRESHOLD:
+        bands.append(IN_STOCK)
+    if is_low_stock(stock):
+        bands.append(LOW_STOCK)
+    if stock == 0:
+        bands.append(OUT_OF_STOCK)
+    return bands
+
+
+def stock_deltas(old_stock, new_stock):
+    deltas = {}
+    if old_stock is not None:
+        for band in stock_bands(old_stock):
+            deltas[band] = deltas.get(band, 0) - 1
+    if new_stock is not None:
+        for band in stock_bands(new_stock):
+            deltas[band] = deltas.get(band, 0) + 1
+    return deltas
+
+
+def apply(deltas):
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        updated = models.InventoryCounter.objects.filter(name=name).update(value=F("value") + delta)
+        if not updated:
+            models.InventoryCounter.objects.get_or_create(name=name)
+            models.InventoryCounter.objects.filter(name=name).update(value=F("value") + delta)
+
+
+def get_all():
+    values = dict.fromkeys(NAMES, 0)
+    values.update(models.InventoryCounter.objects.values_list("name", "value"))
+    return values
+
+
+def compute():
+    products = models.Product.objects.aggregate(
+        **{
+            PRODUCTS: Count("id"),
+            IN_STOCK: Count("id", filter=Q(stock__gt=settings.LOW_STOCK_THRESHOLD)),
+            LOW_STOCK: Count("id", filter=low_stock_filter()),
+            OUT_OF_STOCK: Count("id", filter=Q(stock=0)),
+        }
+    )
+    return {
+        **products,
+        CATEGORIES: models.Category.objects.count(),
+        SUPPLIERS: models.Supplier.objects.count(),
+        USERS: User.objects.filter(is_superuser=False).count(),
+    }
+
+
+def reconcile(fix=True):
+    expected = compute()
+    current = get_all()
+    drift = {
+        name: (current[name], value)
+        for name, value in expected.items()
+        if current[name] != value
+    }
+    if fix:
+        for name, value in expected.items():
+            models.InventoryCounter.objects.update_or_create(name=name, defaults={"value": value})
+    return drift
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from . import caching, counters, models, rollups
+
+CACHE_KEY = "dashboard:snapshot"
+CACHE_TIMEOUT = 60 * 5
+
+
+def counter_stats():
+    values = counters.get_all()
+    return {
+        "total_products": values[counters.PRODUCTS],
+        "total_products_in_stock": values[counters.IN_STOCK],
+        "total_products_low_stock": values[counters.LOW_STOCK],
+        "total_products_out_of_stock": values[counters.OUT_OF_STOCK],
+        "total_categories": values[counters.CATEGORIES],
+        "total_suppliers": values[counters.SUPPLIERS],
+        "total_users": values[counters.USERS],
+    }
+
+
+def supplier_stats():
+    last_30_days = timezone.localtime() - timedelta(days=30)
+    return models.Supplier.objects.annotate(
+        products_count=Count("product")
+    ).aggregate(
+        average_product_for_supplier=Avg("products_count"),
+        new_suppliers_count=Count("id", filter=Q(created_at__gte=last_30_days)),
+        suppliers_with_products=Count("id", filter=Q(products_count__gt=0)),
+        suppliers_without_products=Count("id", filter=Q(products_count=0)),
+    )
+
+
+def build_snapshot():
+    data = {
+        **counter_stats(),
+        **supplier_stats(),
+        "products_average_prices": models.Product.objects.aggregate(average=Avg("price"))["average"],
+    }
+    return {
+        "data": data,
+        "products": list(models.Product.objects.order_by("stock")[:5]),
+        "highest_suppliers": list(
+            models.Supplier.objects.with_products_count().order_by("-products_count")[:5]
+        ),
+        "stock_trend": rollups.trend(),
+    }
+
+
+def get_snapshot():
+    snapshot = cache.get(CACHE_KEY)
+    if snapshot is None:
+        snapshot = build_snapshot()
+        cache.set(CACHE_KEY, snapshot, CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+    caching.invalidate("dashboard")
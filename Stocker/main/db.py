@@ -0,0 +1,10 @@
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    # connection_created fires once per new connection, with CONN_MAX_AGE that is once per worker thread
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
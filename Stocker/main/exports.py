@@ -0,0 +1,120 @@
+import csv
+import zlib
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import counters, models
+
+FILTERS = ("category", "supplier", "stock", "expires_within", "min_price", "max_price")
+
+HEADER = ['ID', 'Title', 'Description', 'Price', 'Stock', 'Expire Date', 'Category', '#Suppliers']
+CHUNK_SIZE = 2000
+BLOCK_SIZE = 64 * 1024
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def price_param(params, name):
+    try:
+        value = Decimal(params.get(name, "").strip())
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def int_param(params, name):
+    value = params.get(name, "").strip()
+    return int(value) if value.isascii() and value.isdigit() else None
+
+
+def filter_products(products, params):
+    # malformed filters are ignored, like an empty one
+    category = int_param(params, "category")
+    if category is not None:
+        products = products.filter(Category_id=category)
+    supplier = int_param(params, "supplier")
+    if supplier is not None:
+        products = products.filter(suppliers=supplier)
+
+    stock = params.get("stock")
+    if stock == "in":
+        products = products.filter(stock__gt=settings.LOW_STOCK_THRESHOLD)
+    elif stock == "low":
+        products = products.filter(counters.low_stock_filter())
+    elif stock == "out":
+        products = products.filter(stock=0)
+
+    min_price = price_param(params, "min_price")
+    if min_price is not None:
+        products = products.filter(price__gte=min_price)
+    max_price = price_param(params, "max_price")
+    if max_price is not None:
+        products = products.filter(price__lte=max_price)
+
+    expires_within = int_param(params, "expires_within")
+    if expires_within is not None:
+        today = timezone.localtime().date()
+        products = products.filter(
+            expire_date__gte=today,
+            expire_date__lte=today + timedelta(days=min(expires_within, 36500)),
+        )
+    return products
+
+
+def csv_rows(products, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    rows = products.with_list_data().order_by('id').values_list(
+        'id', 'title', 'description', 'price', 'stock', 'expire_date', 'Category__title', 'suppliers_count'
+    )
+
+    # rows are joined into blocks so the response isn't flushed once per product
+    block = [writer.writerow(HEADER)]
+    size = len(block[0])
+    for id, title, description, price, stock, expire_date, category, suppliers_count in rows.iterator(chunk_size=chunk_size):
+        line = writer.writerow([
+            id,
+            title,
+            description,
+            price,
+            stock,
+            expire_date.strftime('%Y-%m-%d'),
+            category,
+            suppliers_count
+        ])
+        block.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield "".join(block)
+            block = []
+            size = 0
+    if block:
+        yield "".join(block)
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_query(params, **extra):
+    # the export links carry the listing's filters, the page cursor stays behind
+    query = params.copy()
+    query.pop("cursor", None)
+    query.pop("format", None)
+    for name, value in extra.items():
+        query[name] = value
+    return query.urlencode()
+
+
+def export_products(params):
+    return csv_rows(filter_products(models.Product.objects.all(), params))
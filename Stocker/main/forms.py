@@ -1,6 +1,5 @@
 from django import forms
-from . import models
-from django.contrib.auth.models import Group
+from . import choices,models
 
 class LoginForm(forms.Form):
     username = forms.CharField(max_length=100, error_messages= {
@@ -44,15 +43,17 @@ class ProductForm(forms.Form):
     description = forms.CharField(max_length=500, error_messages= {
         'required':"description is required"
     })
-    price = forms.CharField(max_length=100, error_messages= {
-        'required':"price is required"
+    price = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0, error_messages= {
+        'required':"price is required",
+        'invalid':"price must be a number"
     })
     expire_date = forms.DateField(error_messages={
         'required':"expire date is required"
     })
+    # the product templates render a bounded option list (choices.options), the typeahead searches the rest through main:choice_options
     category = forms.ModelChoiceField(
         queryset=models.Category.objects.all(),
-        empty_label="Select category",
+        widget=forms.HiddenInput,
         error_messages= {
         'required':"category is required"
     }
@@ -60,7 +61,7 @@ class ProductForm(forms.Form):
 
     suppliers = forms.ModelMultipleChoiceField(
         queryset=models.Supplier.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
+        widget=forms.MultipleHiddenInput,
         error_messages= {
         'required':"suppliers is required"
     }
@@ -87,9 +88,9 @@ class UserForm(forms.Form):
     confirm_password = forms.CharField(max_length=50, error_messages={
         'required':"confirm password is required"
     })
-    group = forms.ModelChoiceField(
-        queryset=Group.objects.all(),
-        empty_label="Select Group",
+    group = forms.TypedChoiceField(
+        choices=choices.group_choices,
+        coerce=int,
         error_messages= {
         'required':"Group is required"
     }
@@ -108,9 +109,9 @@ class EditUserForm(forms.Form):
     email = forms.EmailField(max_length=150, error_messages= {
         'required':"email is required"
     })
-    group = forms.ModelChoiceField(
-        queryset=Group.objects.all(),
-        empty_label="Select Group",
+    group = forms.TypedChoiceField(
+        choices=choices.group_choices,
+        coerce=int,
         error_messages= {
         'required':"Group is required"
     }
@@ -0,0 +1,310 @@
+import codecs
+import csv
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import caching, counters, dashboard, models, search
+
+BATCH_SIZE = 1000
+# a running job is taken over when its worker hasn't committed a batch for this long
+LEASE_SECONDS = 300
+
+UPSERT_FIELDS = ['title', 'description', 'price', 'stock', 'expire_date', 'Category_id']
+
+# bulk writes skip the model signals, these fragment groups are bumped when an import finishes
+IMPORT_FRAGMENTS = ("products", "categories")
+
+PRICE_PLACES = Decimal('0.01')
+MAX_PRICE = Decimal('9999999999.99')
+
+
+def decode_lines(uploaded_file):
+    # iterating an UploadedFile yields lines read chunk by chunk, so the upload is never held in memory as a whole
+    return codecs.iterdecode(uploaded_file, 'utf-8-sig')
+
+
+def parse_row(row):
+    if len(row) < 7:
+        raise ValueError(f"expected at least 7 columns, got {len(row)}")
+
+    title = row[1].strip()
+    if not title:
+        raise ValueError("title is required")
+    category_name = row[6].strip()
+    if not category_name:
+        raise ValueError("category is required")
+
+    try:
+        price = Decimal(row[3].strip()).quantize(PRICE_PLACES)
+    except InvalidOperation:
+        raise ValueError(f"invalid price {row[3]!r}")
+    if not price.is_finite() or price < 0 or price > MAX_PRICE:
+        raise ValueError(f"invalid price {row[3]!r}")
+    try:
+        stock = int(row[4])
+    except ValueError:
+        raise ValueError(f"invalid stock {row[4]!r}")
+    try:
+        expire_date = datetime.strptime(row[5], "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"invalid expire date {row[5]!r}")
+
+    return {
+        "id": int(row[0]) if row[0].strip().isdigit() else None,
+        "title": title,
+        "description": row[2],
+        "price": price,
+        "stock": stock,
+        "expire_date": expire_date,
+        "category": category_name,
+    }
+
+
+class ProductImporter:
+
+    def __init__(self, batch_size=BATCH_SIZE, mode=models.ImportJob.MODE_CREATE, user_id=None, note="CSV import"):
+        self.batch_size = batch_size
+        self.mode = mode
+        self.user_id = user_id
+        self.note = note
+        self.rows_read = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.categories = {}
+
+    def category_id(self, title):
+        if title not in self.categories:
+            category = models.Category(title=title)
+            category.save()
+            self.categories[title] = category.id
+        return self.categories[title]
+
+    def create(self, rows):
+        if not rows:
+            return
+        batch = [
+            models.Product(
+                title=data["title"],
+                description=data["description"],
+                price=data["price"],
+                stock=data["stock"],
+                expire_date=data["expire_date"],
+                Category_id=data["Category_id"],
+            )
+            for data in rows
+        ]
+        models.Product.objects.bulk_create(batch, batch_size=self.batch_size)
+        search.index_products([product.id for product in batch])
+        self.record_movements([(product, 0) for product in batch])
+
+        # bulk_create skips the model signals, so counters are updated here once per batch
+        deltas = {counters.PRODUCTS: len(batch)}
+        for product in batch:
+            for band, delta in counters.stock_deltas(None, product.stock).items():
+                deltas[band] = deltas.get(band, 0) + delta
+        counters.apply(deltas)
+        self.created += len(batch)
+
+    def record_movements(self, changes):
+        models.StockMovement.objects.bulk_create(
+            [
+                models.StockMovement(
+                    product_id=product.id,
+                    kind=models.StockMovement.KIND_IMPORT,
+                    delta=product.stock - previous_stock,
+                    stock_after=product.stock,
+                    note=self.note,
+                    created_by_id=self.user_id,
+                )
+                for product, previous_stock in changes
+                if product.stock != previous_stock
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def match_existing(self, rows):
+        by_id = models.Product.objects.in_bulk([data["id"] for data in rows if data["id"]])
+
+        unmatched = [data for data in rows if data["id"] not in by_id]
+        by_title = {}
+        if unmatched:
+            candidates = models.Product.objects.filter(
+                title__in={data["title"] for data in unmatched},
+                Category_id__in={data["Category_id"] for data in unmatched},
+            ).order_by('-id')
+            by_title = {(product.title, product.Category_id): product for product in candidates}
+
+        return [
+            by_id.get(data["id"]) or by_title.get((data["title"], data["Category_id"]))
+            for data in rows
+        ]
+
+    def upsert(self, rows):
+        if not rows:
+            return
+        to_create = []
+        to_update = {}
+        changed_fields = set()
+        deltas = {}
+        stock_changes = []
+
+        for data, product in zip(rows, self.match_existing(rows)):
+            if product is None:
+                to_create.append(data)
+                continue
+
+            previous_stock = product.stock
+            for field in UPSERT_FIELDS:
+                if getattr(product, field) != data[field]:
+                    setattr(product, field, data[field])
+                    changed_fields.add(field)
+                    to_update[product.id] = product
+
+            if product.stock != previous_stock:
+                stock_changes.append((product, previous_stock))
+                for band, delta in counters.stock_deltas(previous_stock, product.stock).items():
+                    deltas[band] = deltas.get(band, 0) + delta
+
+        # unchanged rows cost nothing beyond the lookup, only the changed columns are written
+        if to_update:
+            models.Product.objects.bulk_update(to_update.values(), sorted(changed_fields), batch_size=self.batch_size)
+            search.index_products(to_update.keys())
+            counters.apply(deltas)
+            self.record_movements(stock_changes)
+            self.updated += len(to_update)
+        self.create(to_create)
+
+    def write(self, rows):
+        if self.mode == models.ImportJob.MODE_UPSERT:
+            self.upsert(rows)
+        else:
+            self.create(rows)
+
+    def end_batch(self, rows):
+        self.write(rows)
+
+    def process(self, lines, skip=0):
+        reader = csv.reader(lines)
+        next(reader, None)
+
+        self.categories = dict(models.Category.objects.values_list('title', 'id'))
+        rows = []
+        pending_rows = 0
+        for row in reader:
+            self.rows_read += 1
+            if self.rows_read <= skip:
+                continue
+            pending_rows += 1
+
+            try:
+                data = parse_row(row)
+            except ValueError as e:
+                self.errors.append((reader.line_num, str(e)))
+            else:
+                data["Category_id"] = self.category_id(data.pop("category"))
+                rows.append(data)
+
+            if pending_rows >= self.batch_size:
+                self.end_batch(rows)
+                rows = []
+                pending_rows = 0
+        self.end_batch(rows)
+
+    def run(self, lines):
+        with transaction.atomic():
+            self.process(lines)
+        dashboard.invalidate()
+        caching.invalidate(*IMPORT_FRAGMENTS)
+        return self
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def claim_jobs(worker, lease_seconds=LEASE_SECONDS):
+    # pending jobs, and running jobs whose worker stopped sending heartbeats for longer than the lease
+    stale = timezone.now() - timedelta(seconds=lease_seconds)
+    claimable = Q(status=models.ImportJob.STATUS_PENDING) | Q(
+        Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True), status=models.ImportJob.STATUS_RUNNING
+    )
+    claimed = []
+    for job_id in models.ImportJob.objects.filter(claimable).order_by("id").values_list("id", flat=True):
+        # the conditional update makes sure a job is only picked up by one worker
+        if models.ImportJob.objects.filter(claimable, pk=job_id).update(
+            status=models.ImportJob.STATUS_RUNNING, claimed_by=worker, heartbeat_at=timezone.now()
+        ):
+            claimed.append(job_id)
+    return claimed
+
+
+class ImportJobRunner(ProductImporter):
+    # each batch commits together with the job progress, so a restarted worker resumes after the last committed batch
+
+    MAX_ERRORS = 100
+
+    def __init__(self, job:models.ImportJob, worker, batch_size=BATCH_SIZE):
+        super().__init__(batch_size, job.mode, job.created_by_id, f"CSV import {job.id}")
+        self.job = job
+        self.worker = worker
+        self.reported_errors = 0
+
+    def save_job(self, **fields):
+        # every job write is fenced by the claim, a worker whose lease was taken over stops instead of importing twice
+        fields["heartbeat_at"] = timezone.now()
+        if not models.ImportJob.objects.filter(pk=self.job.pk, claimed_by=self.worker).update(**fields):
+            raise LeaseLost(f"import {self.job.pk} was taken over by another worker")
+
+    def end_batch(self, rows):
+        with transaction.atomic():
+            created, updated = self.created, self.updated
+            self.write(rows)
+            new_errors = self.errors[self.reported_errors:]
+            self.reported_errors = len(self.errors)
+
+            self.job.rows_processed = self.rows_read
+            self.job.rows_created += self.created - created
+            self.job.rows_updated += self.updated - updated
+            self.job.rows_failed += len(new_errors)
+            logged = self.job.errors.count("\n") if self.job.errors else 0
+            for line, error in new_errors[:max(self.MAX_ERRORS - logged, 0)]:
+                self.job.errors += f"line {line}: {error}\n"
+            # the batch is rolled back with this update when the lease was lost
+            self.save_job(
+                rows_processed=self.job.rows_processed,
+                rows_created=self.job.rows_created,
+                rows_updated=self.job.rows_updated,
+                rows_failed=self.job.rows_failed,
+                errors=self.job.errors,
+            )
+
+    def run(self):
+        job = self.job
+        if not job.started_at:
+            job.started_at = timezone.now()
+
+        try:
+            self.save_job(status=models.ImportJob.STATUS_RUNNING, started_at=job.started_at)
+            try:
+                with job.file.open("rb") as uploaded_file:
+                    self.process(decode_lines(uploaded_file), skip=job.rows_processed)
+            except LeaseLost:
+                raise
+            except Exception as e:
+                job.status = models.ImportJob.STATUS_FAILED
+                job.errors += f"import stopped: {e}\n"
+            else:
+                job.status = models.ImportJob.STATUS_DONE
+            job.finished_at = timezone.now()
+            self.save_job(status=job.status, errors=job.errors, finished_at=job.finished_at)
+        except LeaseLost:
+            job.refresh_from_db()
+            return job
+        dashboard.invalidate()
+        caching.invalidate(*IMPORT_FRAGMENTS)
+        return job
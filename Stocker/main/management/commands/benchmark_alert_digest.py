@@ -0,0 +1,132 @@
+import socketserver
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from main import benchmarks, models, notifications
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # just enough SMTP for django's backend, every connection and message is counted
+
+    def handle(self):
+        self.server.count("connections")
+        time.sleep(self.server.connect_latency)
+        self.reply("220 stocker-benchmark ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 stocker-benchmark")
+            elif command == b"DATA":
+                self.reply("354 end data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.count("messages")
+                self.reply("250 queued")
+            elif command == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b"\r\n")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_latency):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.connect_latency = connect_latency
+        self.lock = threading.Lock()
+        self.counts = {"connections": 0, "messages": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def reset(self):
+        with self.lock:
+            self.counts = {"connections": 0, "messages": 0}
+
+
+def send_one_by_one():
+    # how alerts were sent before the outbox: one EmailMessage.send() and one SMTP connection per manager per alert
+    for notification in models.Notification.objects.select_related("product").order_by("id"):
+        subject, content = notifications.render_notification(notification)
+        email = EmailMessage(subject, content, None, [notification.recipient])
+        email.content_subtype = "html"
+        email.send()
+
+
+def send_pooled():
+    while notifications.send_pending_notifications()[0]:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Compare per-message SMTP connections with the pooled outbox and the digest, against a local SMTP stand-in"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--managers", type=int, default=5)
+        parser.add_argument("--alerts", type=int, default=100, help="low stock products, each alerting every manager")
+        parser.add_argument("--connect-latency", type=float, default=30, help="ms added to every new SMTP connection, a TLS handshake to a remote server costs tens of ms")
+
+    def handle(self, *args, **options):
+        server = SMTPStandIn(options["connect_latency"] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        email_settings = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            DEFAULT_FROM_EMAIL="stocker@example.com",
+            ALERT_RECIPIENTS=[],
+        )
+        try:
+            with benchmarks.scratch_database(), email_settings:
+                rows = self.run(server, options["managers"], options["alerts"])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write(
+            f"{options['managers']} managers x {options['alerts']} alerts, "
+            f"{options['connect_latency']:g} ms per new connection"
+        )
+        benchmarks.write_table(self.stdout, ["strategy", "emails", "connections", "wall ms"], rows)
+
+    def run(self, server, managers, alerts):
+        for i in range(managers):
+            User.objects.create_superuser(f"manager{i}", f"manager{i}@example.com", None)
+        category = models.Category.objects.create(title="benchmark")
+        products = models.Product.objects.bulk_create([
+            models.Product(title=f"product {i}", description="benchmark", stock=1, Category=category)
+            for i in range(alerts)
+        ])
+        notifications.enqueue_low_stock_alerts([product.id for product in products])
+
+        rows = []
+        for name, send in (
+            ("one connection per email", send_one_by_one),
+            ("pooled outbox", send_pooled),
+            ("digest", notifications.send_alert_digest),
+        ):
+            models.Notification.objects.update(status=models.Notification.STATUS_PENDING)
+            server.reset()
+            start = time.perf_counter()
+            send()
+            elapsed = (time.perf_counter() - start) * 1000
+            rows.append([name, server.counts["messages"], server.counts["connections"], f"{elapsed:.0f}"])
+        return rows
@@ -0,0 +1,83 @@
+import csv
+import io
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from main import benchmarks, exports, models
+
+BATCH_SIZE = 10000
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def buffered_export(limit):
+    # the export before streaming: the whole file in one buffer, category and supplier count loaded per row
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(exports.HEADER)
+    for product in models.Product.objects.order_by("id")[:limit]:
+        writer.writerow([
+            product.id,
+            product.title,
+            product.description,
+            product.price,
+            product.stock,
+            product.expire_date.strftime('%Y-%m-%d'),
+            product.Category.title,
+            product.suppliers.count(),
+        ])
+    return len(buffer.getvalue())
+
+
+def streamed_export(gzip):
+    rows = exports.export_products({})
+    return sum(len(block) for block in (exports.gzip_stream(rows) if gzip else rows))
+
+
+class Command(BaseCommand):
+    help = "Time the streaming CSV export against the old buffered export on a large products table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000000)
+        parser.add_argument("--baseline-rows", type=int, default=10000, help="rows exported the old way, it runs two queries per row")
+
+    def handle(self, *args, **options):
+        with benchmarks.scratch_database():
+            rows = self.run(options["rows"], min(options["rows"], options["baseline_rows"]))
+        benchmarks.write_table(self.stdout, ["export", "rows", "queries", "wall ms", "peak KB", "bytes"], rows)
+
+    def run(self, total, baseline_rows):
+        categories = models.Category.objects.bulk_create([models.Category(title=f"category {i}") for i in range(50)])
+        supplier = models.Supplier.objects.create(name="benchmark", email="b@example.com", website="http://example.com", phone="0")
+        for start in range(0, total, BATCH_SIZE):
+            products = models.Product.objects.bulk_create([
+                models.Product(title=f"product {i}", description="benchmark product", stock=i % 300, Category=categories[i % 50])
+                for i in range(start, min(total, start + BATCH_SIZE))
+            ])
+            models.Product.suppliers.through.objects.bulk_create([
+                models.Product.suppliers.through(product_id=product.id, supplier_id=supplier.id)
+                for product in products[::10]
+            ])
+
+        rows = []
+        for name, count, export in (
+            ("buffered, per-row queries", baseline_rows, lambda: buffered_export(baseline_rows)),
+            ("streamed csv", total, lambda: streamed_export(False)),
+            ("streamed gzip", total, lambda: streamed_export(True)),
+        ):
+            counter = QueryCounter()
+            result = {}
+            with connection.execute_wrapper(counter):
+                ms, kb = benchmarks.measure(lambda: result.setdefault("bytes", export()), repeat=1)
+            # measure() runs the export twice, once timed and once traced
+            rows.append([name, count, counter.count // 2, f"{ms:.0f}", f"{kb:.0f}", result["bytes"]])
+        return rows
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main import benchmarks, models
+
+BATCH_SIZE = 5000
+
+
+def annotate_every_row():
+    # what the listings did before: days_to_expire set on every product before paginating
+    today = timezone.localtime().date()
+    for product in models.Product.objects.all():
+        product.days_to_expire = (product.expire_date - today).days
+
+
+class Command(BaseCommand):
+    help = "Show that the product list stays flat in time and memory as the products table grows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated table sizes")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        with benchmarks.scratch_database(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            rows = self.run(sizes)
+        benchmarks.write_table(
+            self.stdout,
+            ["products", "full loop ms", "full loop KB", "page ms", "page KB"],
+            rows,
+        )
+
+    def run(self, sizes):
+        user = User.objects.create_superuser("benchmark", "benchmark@example.com", None)
+        client = Client()
+        client.force_login(user)
+        category = models.Category.objects.create(title="benchmark")
+        today = timezone.localtime().date()
+
+        def render_page():
+            # a cold fragment cache, so the page is built from the database every time
+            cache.clear()
+            client.force_login(user)
+            client.get(reverse("main:products_view"))
+
+        rows = []
+        for size in sizes:
+            existing = models.Product.objects.count()
+            models.Product.objects.bulk_create([
+                models.Product(title=f"product {i}", description="benchmark", Category=category, expire_date=today + timedelta(days=i % 365))
+                for i in range(existing, size)
+            ], batch_size=BATCH_SIZE)
+            loop_ms, loop_kb = benchmarks.measure(annotate_every_row)
+            page_ms, page_kb = benchmarks.measure(render_page)
+            rows.append([size, f"{loop_ms:.0f}", f"{loop_kb:.0f}", f"{page_ms:.1f}", f"{page_kb:.0f}"])
+        return rows
@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import benchmarks, models, search
+
+BATCH_SIZE = 10000
+WORDS = [
+    "apple", "banana", "cherry", "coffee", "yogurt", "butter", "cheese", "bread", "olive", "pepper",
+    "salmon", "tomato", "vanilla", "walnut", "honey", "ginger", "lemon", "mango", "rice", "noodle",
+]
+# apple0 .. walnut49, a prefix like "app" matches a large share of the table, a whole word a small one
+VOCABULARY = [f"{word}{n}" for word in WORDS for n in range(50)]
+TERMS = ["app", "hon", "coffee12", "salmon3 lemon7", "zzz"]
+
+
+def first_page(queryset):
+    # what a search listing runs: the first page and the total shown above it
+    return list(queryset.values_list("id", flat=True)[:10]), queryset.count()
+
+
+def like_search(term):
+    # the listing search before the index: a leading wildcard LIKE on the title
+    return first_page(models.Product.objects.filter(title__contains=term).order_by("id"))
+
+
+def fts_search(term):
+    return first_page(search.search_products(models.Product.objects.all(), term))
+
+
+class Command(BaseCommand):
+    help = "Compare the FTS5 product search with the old LIKE search at growing table sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated table sizes")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError("the search index needs SQLite")
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        with benchmarks.scratch_database():
+            rows = self.run(sizes, options["repeat"])
+        benchmarks.write_table(self.stdout, ["products", "term", "like p50 ms", "fts p50 ms"], rows)
+
+    def run(self, sizes, repeat):
+        randomizer = random.Random(0)
+        category = models.Category.objects.create(title="groceries")
+        rows = []
+        for size in sizes:
+            existing = models.Product.objects.count()
+            for start in range(existing, size, BATCH_SIZE):
+                products = models.Product.objects.bulk_create([
+                    models.Product(
+                        title=" ".join(randomizer.sample(VOCABULARY, 3)) + f" {i}",
+                        description=" ".join(randomizer.sample(VOCABULARY, 8)),
+                        Category=category,
+                    )
+                    for i in range(start, min(size, start + BATCH_SIZE))
+                ])
+                search.index_products([product.id for product in products])
+
+            for term in TERMS:
+                timings = {}
+                for name, function in (("like", like_search), ("fts", fts_search)):
+                    samples = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        function(term)
+                        samples.append((time.perf_counter() - start) * 1000)
+                    timings[name] = statistics.median(samples)
+                rows.append([size, term, f"{timings['like']:.2f}", f"{timings['fts']:.2f}"])
+        return rows
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from main import benchmarks, exports, models, stock
+
+PROFILES = ("development", "production")
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = "Run readers and a writer against a copy of the SQLite database under each DB_PROFILE"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=6)
+        parser.add_argument("--seconds", type=float, default=6)
+        parser.add_argument("--products", type=int, default=20000, help="the copy is topped up to this many products")
+        parser.add_argument("--write-size", type=int, default=500, help="stock movements per write transaction")
+        parser.add_argument("--worker", choices=("seed", "reader", "writer"), help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return getattr(self, options["worker"])(options)
+        if connection.vendor != "sqlite":
+            raise CommandError("benchmark_sqlite_concurrency compares SQLite profiles")
+
+        # the configured database is only read, every run works on its own copy
+        with tempfile.TemporaryDirectory() as directory:
+            seeded = os.path.join(directory, "seeded.sqlite3")
+            shutil.copyfile(settings.DATABASES["default"]["NAME"], seeded)
+            self.call(seeded, "development", ["migrate", "-v0"])
+            self.call(seeded, "development", ["benchmark_sqlite_concurrency", "--worker", "seed", "--products", str(options["products"])])
+
+            rows = []
+            for profile in PROFILES:
+                database = os.path.join(directory, f"{profile}.sqlite3")
+                shutil.copyfile(seeded, database)
+                rows.append([profile, *self.run(database, profile, options)])
+
+        self.stdout.write(
+            f"{options['readers']} readers and 1 writer for {options['seconds']:g}s, "
+            f"{options['products']} products, {options['write_size']} movements per write"
+        )
+        benchmarks.write_table(self.stdout, ["profile", "reads/s", "p50 ms", "p99 ms", "read errors", "writes/s", "write errors"], rows)
+
+    def environment(self, database, profile):
+        return {**os.environ, "DB_NAME": database, "DB_PROFILE": profile, "PROFILING": "0"}
+
+    def command(self, arguments):
+        return [sys.executable, str(settings.BASE_DIR / "manage.py"), *arguments]
+
+    def call(self, database, profile, arguments):
+        subprocess.run(self.command(arguments), env=self.environment(database, profile), check=True)
+
+    def run(self, database, profile, options):
+        worker = ["benchmark_sqlite_concurrency", "--seconds", str(options["seconds"]), "--write-size", str(options["write_size"])]
+        processes = [
+            subprocess.Popen(self.command([*worker, "--worker", "reader"]), env=self.environment(database, profile), stdout=subprocess.PIPE)
+            for _ in range(options["readers"])
+        ]
+        writer = subprocess.Popen(self.command([*worker, "--worker", "writer"]), env=self.environment(database, profile), stdout=subprocess.PIPE)
+
+        latencies = []
+        read_errors = 0
+        for process in processes:
+            result = json.loads(process.communicate()[0])
+            latencies += result["latencies"]
+            read_errors += result["errors"]
+        result = json.loads(writer.communicate()[0])
+
+        latencies.sort()
+        return [
+            f"{len(latencies) / options['seconds']:.0f}",
+            f"{statistics.median(latencies):.1f}" if latencies else "-",
+            f"{latencies[int(len(latencies) * 0.99)]:.1f}" if latencies else "-",
+            read_errors,
+            f"{result['writes'] / options['seconds']:.1f}",
+            result["errors"],
+        ]
+
+    def seed(self, options):
+        category = models.Category.objects.order_by("id").first() or models.Category.objects.create(title="benchmark")
+        existing = models.Product.objects.count()
+        for start in range(existing, options["products"], BATCH_SIZE):
+            models.Product.objects.bulk_create([
+                models.Product(title=f"benchmark {i}", description="benchmark", stock=i % 300, Category=category)
+                for i in range(start, min(options["products"], start + BATCH_SIZE))
+            ])
+
+    def reader(self, options):
+        # the low stock listing: a filtered first page and its count, like products_view with ?stock=low
+        latencies = []
+        errors = 0
+        deadline = time.monotonic() + options["seconds"]
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                products = exports.filter_products(models.Product.objects.with_list_data(), {"stock": "low"})
+                list(products.order_by("stock", "id")[:10])
+                products.count()
+            except OperationalError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(json.dumps({"latencies": latencies, "errors": errors}))
+
+    def writer(self, options):
+        ids = list(models.Product.objects.values_list("id", flat=True))
+        randomizer = random.Random(0)
+        writes = errors = 0
+        deadline = time.monotonic() + options["seconds"]
+        while time.monotonic() < deadline:
+            movements = [
+                {"product_id": product_id, "delta": randomizer.choice((-1, 1))}
+                for product_id in randomizer.sample(ids, min(len(ids), options["write_size"]))
+            ]
+            try:
+                stock.apply_bulk(movements)
+            except OperationalError:
+                errors += 1
+                continue
+            writes += 1
+        self.stdout.write(json.dumps({"writes": writes, "errors": errors}))
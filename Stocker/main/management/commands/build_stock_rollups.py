@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main import dashboard, rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new stock movements into the daily and weekly stock rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=rollups.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        processed = rollups.build(options["chunk_size"])
+        if processed:
+            dashboard.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"rolled up {processed} stock movements"))
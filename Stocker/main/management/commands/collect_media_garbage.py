@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main import media, models
+
+# (model, field) pairs whose files live in the swept directories
+REFERENCES = [
+    (models.Product, "image"),
+    (models.Supplier, "logo"),
+]
+
+
+def referenced_names():
+    names = set()
+    for model, field_name in REFERENCES:
+        field = model._meta.get_field(field_name)
+        # the shared default is always kept, even while no row uses it
+        names.add(field.default)
+        names.update(model.objects.exclude(**{field_name: ""}).values_list(field_name, flat=True).distinct())
+    return names
+
+
+class Command(BaseCommand):
+    help = "Delete uploaded images and their variants that no product or supplier references"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="only list the files that would be deleted")
+        parser.add_argument(
+            "--grace-minutes", type=int, default=60,
+            help="keep files younger than this, their row may not be committed yet",
+        )
+
+    def handle(self, *args, **options):
+        # one query per field instead of a lookup per file
+        referenced = {media.original_root(name) for name in referenced_names()}
+        cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+
+        deleted = kept = 0
+        for directory in sorted({model._meta.get_field(field_name).upload_to for model, field_name in REFERENCES}):
+            if not default_storage.exists(directory):
+                continue
+            for filename in default_storage.listdir(directory)[1]:
+                name = directory + filename
+                if media.original_root(name) in referenced or default_storage.get_modified_time(name) > cutoff:
+                    kept += 1
+                    continue
+                deleted += 1
+                self.stdout.write(f"{'would delete' if options['dry_run'] else 'deleted'} {name}")
+                if not options["dry_run"]:
+                    default_storage.delete(name)
+                    media.forget_variants(name)
+
+        self.stdout.write(self.style.SUCCESS(f"{deleted} unreferenced files {'found' if options['dry_run'] else 'deleted'}, {kept} kept"))
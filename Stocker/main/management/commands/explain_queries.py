@@ -0,0 +1,104 @@
+import contextlib
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from main import benchmarks, models, pagination, queryplans
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN QUERY PLAN on every query the views issue and flag full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fail-on-scan", action="store_true", help="exit with an error when a full table scan is found")
+        parser.add_argument("--ignore", action="append", default=[], help="table whose full scans are expected, can be repeated")
+        parser.add_argument(
+            "--current-database", action="store_true",
+            help="render the views on the configured database instead of a throwaway one, the test suite runs on its own database",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("explain_queries reads SQLite query plans")
+
+        # fixtures only ever land in a throwaway database or in a rolled back transaction,
+        # and the views cache into a private cache so nothing outlives the run
+        database = (
+            override_settings(CACHES=benchmarks.BENCHMARK_CACHES) if options["current_database"] else benchmarks.scratch_database()
+        )
+        with database, override_settings(ALLOWED_HOSTS=["testserver"]):
+            view_queries = self.capture_view_queries()
+
+            scans = 0
+            for url_name, url, sql in view_queries:
+                plan = queryplans.explain(sql)
+                flagged = [
+                    detail for detail in plan
+                    if queryplans.is_full_scan(detail)
+                    and not queryplans.is_allowed(url_name, detail.split()[1])
+                    and detail.split()[1] not in options["ignore"]
+                ]
+                if not flagged:
+                    continue
+                scans += len(flagged)
+                self.stdout.write(self.style.WARNING(f"{url}: {sql[:200]}"))
+                for detail in plan:
+                    self.stdout.write(f"    {'!! ' if detail in flagged else '   '}{detail}")
+
+        self.stdout.write(f"checked {len(view_queries)} queries, {scans} full table scans")
+        if scans and options["fail_on_scan"]:
+            raise CommandError(f"{scans} full table scans found")
+
+    def capture_view_queries(self):
+        captured = []
+        with contextlib.suppress(Rollback), transaction.atomic():
+            # every view gets something to render, the rows are rolled back at the end
+            user = User.objects.create_superuser("explain-queries", "explain@example.com", None)
+            category = models.Category.objects.create(title="explain")
+            supplier = models.Supplier.objects.create(name="explain", email="explain@example.com", website="http://example.com", phone="0")
+            product = models.Product.objects.create(title="explain", description="explain", Category=category)
+            product.suppliers.add(supplier)
+            cursor = pagination.encode_cursor([product.created_at, product.id], "next")
+
+            urls = [
+                ("main:home_view", reverse("main:home_view")),
+                ("main:products_view", reverse("main:products_view")),
+                ("main:products_view", reverse("main:products_view") + "?cursor=" + cursor),
+                ("main:products_view", reverse("main:products_view") + "?search=explain"),
+                ("main:products_view", reverse("main:products_view") + "?sort=-price&min_price=1"),
+                ("main:categories_view", reverse("main:categories_view")),
+                ("main:categories_view", reverse("main:categories_view") + "?searchcategory=explain"),
+                ("main:suppliers_view", reverse("main:suppliers_view")),
+                ("main:suppliers_view", reverse("main:suppliers_view") + "?searchsupplier=explain"),
+                ("main:supplier_products_view", reverse("main:supplier_products_view", args=[supplier.id])),
+                ("main:product_suppliers_view", reverse("main:product_suppliers_view", args=[product.id])),
+                ("main:users_view", reverse("main:users_view")),
+                ("main:export_products", reverse("main:export_products") + "?stock=low&expires_within=10"),
+                ("main:choice_options", reverse("main:choice_options", args=["suppliers"])),
+                ("main:choice_options", reverse("main:choice_options", args=["suppliers"]) + "?q=explain"),
+                ("main:choice_options", reverse("main:choice_options", args=["categories"])),
+                ("main:edit_product", reverse("main:edit_product", args=[product.id])),
+                ("main:add_user", reverse("main:add_user")),
+            ]
+
+            client = Client()
+            client.force_login(user)
+            for url_name, url in urls:
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                captured += [
+                    (url_name, url, query["sql"]) for query in queries.captured_queries
+                    if query["sql"].lstrip().upper().startswith("SELECT")
+                ]
+            raise Rollback
+        return captured
@@ -0,0 +1,33 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main import media, models
+
+DIRECTORIES = [
+    models.Product._meta.get_field("image").upload_to,
+    models.Supplier._meta.get_field("logo").upload_to,
+]
+
+
+class Command(BaseCommand):
+    help = "Generate the resized image variants for product images and supplier logos already in media/"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--overwrite", action="store_true", help="regenerate variants that already exist")
+
+    def handle(self, *args, **options):
+        generated = skipped = 0
+        for directory in DIRECTORIES:
+            if not default_storage.exists(directory):
+                continue
+            for filename in default_storage.listdir(directory)[1]:
+                name = directory + filename
+                if media.is_variant(name):
+                    continue
+                written = media.generate(default_storage, name, overwrite=options["overwrite"])
+                if written:
+                    generated += 1
+                    self.stdout.write(f"{name}: {len(written)} variants")
+                else:
+                    skipped += 1
+        self.stdout.write(self.style.SUCCESS(f"generated variants for {generated} files, {skipped} skipped"))
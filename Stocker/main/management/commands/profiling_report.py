@@ -0,0 +1,94 @@
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORTS = ("p95", "mean", "max", "total", "sql")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = "Summarise the profiling log into the slowest endpoints, see PROFILING in settings.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=settings.PROFILING_LOG, help="JSON lines written by ProfilingMiddleware")
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--sort", choices=SORTS, default="p95")
+        parser.add_argument("--since", help="only requests logged at or after this ISO timestamp")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["log"]) as log:
+                records = self.read(log, options["since"])
+        except FileNotFoundError:
+            raise CommandError(f"no profiling log at {options['log']}, run the site with PROFILING=1 first")
+        if not records:
+            self.stdout.write("no profiled requests")
+            return
+
+        endpoints = defaultdict(list)
+        for record in records:
+            endpoints[(record["method"], record["view"] or record["path"])].append(record)
+
+        rows = [self.summarise(method, view, requests) for (method, view), requests in endpoints.items()]
+        rows.sort(key=lambda row: row[options["sort"]], reverse=True)
+        rows = rows[:options["limit"]]
+
+        self.stdout.write(f"{len(records)} requests, {len(endpoints)} endpoints, sorted by {options['sort']}\n")
+        self.stdout.write(
+            f"{'endpoint':<40} {'n':>6} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9} "
+            f"{'sql':>6} {'sql ms':>8} {'dup':>5} {'tpl ms':>8} {'peak KB':>9}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['endpoint'][:40]:<40} {row['count']:>6} {row['mean']:>9.1f} {row['p95']:>9.1f} {row['max']:>9.1f} "
+                f"{row['sql']:>6.1f} {row['sql_ms']:>8.1f} {row['duplicates']:>5} {row['template_ms']:>8.1f} "
+                f"{row['peak_memory_kb'] if row['peak_memory_kb'] is not None else '-':>9}"
+            )
+
+        flagged = [row for row in rows if row["repeated"]]
+        if flagged:
+            self.stdout.write(self.style.WARNING("\nstatements repeated within one request, likely N+1 queries:"))
+        for row in flagged:
+            self.stdout.write(row["endpoint"])
+            for sql, count in row["repeated"]:
+                self.stdout.write(f"    up to {count}x  {sql[:160]}")
+
+    def read(self, log, since):
+        records = []
+        for line in log:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if since and record.get("ts", "") < since:
+                continue
+            records.append(record)
+        return records
+
+    def summarise(self, method, view, requests):
+        totals = [request["total_ms"] for request in requests]
+        memory = [request["peak_memory_kb"] for request in requests if "peak_memory_kb" in request]
+        repeated = Counter()
+        for request in requests:
+            for query in request.get("repeated_queries", []):
+                repeated[query["sql"]] = max(repeated[query["sql"]], query["count"])
+        return {
+            "endpoint": f"{method} {view}",
+            "count": len(requests),
+            "mean": sum(totals) / len(totals),
+            "p95": percentile(totals, 0.95),
+            "max": max(totals),
+            "total": sum(totals),
+            "sql": sum(request["sql_count"] for request in requests) / len(requests),
+            "sql_ms": sum(request["sql_ms"] for request in requests) / len(requests),
+            "duplicates": max(request["duplicate_queries"] for request in requests),
+            "template_ms": sum(request["template_ms"] for request in requests) / len(requests),
+            "peak_memory_kb": max(memory) if memory else None,
+            "repeated": repeated.most_common(3),
+        }
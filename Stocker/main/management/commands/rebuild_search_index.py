@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for products, suppliers and categories"
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError("full-text search needs the SQLite FTS5 extension")
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS("search index rebuilt"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from main import counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the inventory counters from the source tables and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="only report drift, do not fix the counters")
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile(fix=not options["dry_run"])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("inventory counters are in sync"))
+            return
+
+        for name, (stored, actual) in drift.items():
+            self.stdout.write(self.style.WARNING(f"{name}: stored {stored}, actual {actual} (drift {stored - actual:+d})"))
+        if not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"fixed {len(drift)} counters"))
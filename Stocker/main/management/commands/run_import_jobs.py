@@ -0,0 +1,48 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main import importers, models
+
+
+def run_job(job_id, worker):
+    try:
+        job = models.ImportJob.objects.get(pk=job_id)
+        return importers.ImportJobRunner(job, worker).run()
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Process uploaded CSV import jobs off the request thread"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--loop", action="store_true", help="keep polling for new jobs instead of exiting when none are left")
+        parser.add_argument("--interval", type=float, default=5, help="seconds to wait between polls in --loop mode")
+        parser.add_argument("--lease", type=float, default=importers.LEASE_SECONDS, help="seconds without a heartbeat before a running job is taken over")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                # jobs left running by a worker that stopped are claimed again once their lease expired,
+                # they resume from their last committed batch
+                job_ids = importers.claim_jobs(worker, options["lease"])
+                for job in pool.map(run_job, job_ids, [worker] * len(job_ids)):
+                    if job.claimed_by != worker:
+                        self.stdout.write(f"import {job.id} was taken over by {job.claimed_by}")
+                        continue
+                    self.stdout.write(
+                        f"import {job.id} {job.status}: {job.rows_created} created, {job.rows_updated} updated, {job.rows_failed} failed, "
+                        f"{job.rows_processed} rows at {job.rows_per_second()} rows/s"
+                    )
+
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import notifications
+
+
+class Command(BaseCommand):
+    help = "Send one alerts digest per manager covering every pending alert in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument("--loop", action="store_true", help="send a digest every --window minutes")
+        parser.add_argument("--window", type=float, default=settings.ALERT_DIGEST_WINDOW_MINUTES, help="minutes collected into each digest in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                self.send(options["max_attempts"])
+            except Exception as e:
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"alert digest failed: {e}")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["window"] * 60)
+
+    def send(self, max_attempts):
+        started = time.monotonic()
+        sent, alerts = notifications.send_alert_digest(max_attempts)
+        elapsed = time.monotonic() - started
+        if alerts:
+            self.stdout.write(
+                f"sent {sent} digest emails covering {alerts} alerts over one SMTP connection in {elapsed:.2f}s"
+            )
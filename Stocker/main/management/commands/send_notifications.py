@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import notifications
+
+
+class Command(BaseCommand):
+    help = "Drain the notification outbox over pooled SMTP connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument("--loop", action="store_true", help="keep polling the outbox instead of exiting when it is empty")
+        parser.add_argument("--interval", type=float, default=30, help="seconds to wait between polls in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                self.drain(options["batch_size"], options["max_attempts"])
+            except Exception as e:
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"outbox drain failed: {e}")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def drain(self, batch_size, max_attempts):
+        started = time.monotonic()
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = notifications.send_pending_notifications(batch_size, max_attempts)
+            total_sent += sent
+            total_failed += failed
+            # stop on an empty outbox or when a whole batch failed, failed rows are retried on the next run
+            if sent == 0:
+                break
+
+        elapsed = time.monotonic() - started
+        if total_sent or total_failed:
+            rate = total_sent / elapsed if elapsed else 0
+            self.stdout.write(
+                f"sent {total_sent} notifications, {total_failed} failed in {elapsed:.2f}s ({rate:.1f} msg/s)"
+            )
@@ -0,0 +1,115 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# name: (width, height), images are scaled down to fit and never enlarged
+VARIANTS = {
+    "thumb": (160, 160),
+    "card": (480, 480),
+}
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+# whether an original has its variants is cached, so rendering a list never stats the files.
+# names are content hashes, a name that has its variants keeps them until the garbage collector removes them
+VARIANTS_CACHE_TIMEOUT = 60 * 60 * 24
+MISSING_VARIANTS_CACHE_TIMEOUT = 60 * 5
+
+
+def variant_name(name, variant, fmt):
+    # stored next to the original: images/apple.png -> images/apple.thumb.webp
+    root, ext = os.path.splitext(name)
+    return f"{root}.{variant}.{fmt}"
+
+
+def variant_names(name):
+    return [variant_name(name, variant, fmt) for variant in VARIANTS for fmt in FORMATS]
+
+
+def is_variant(name):
+    parts = os.path.basename(name).rsplit(".", 2)
+    return len(parts) == 3 and parts[1] in VARIANTS and parts[2] in FORMATS
+
+
+def _variants_key(name):
+    # keyed by the original's root, so deleting a variant can clear it too
+    return "variants:" + hashlib.md5(original_root(name).encode()).hexdigest()
+
+
+def forget_variants(name):
+    cache.delete(_variants_key(name))
+
+
+def has_variants(storage, name):
+    key = _variants_key(name)
+    ready = cache.get(key)
+    if ready is None:
+        # every variant is written by generate(), checking one of them is enough
+        ready = storage.exists(variant_name(name, next(iter(VARIANTS)), next(iter(FORMATS))))
+        cache.set(key, ready, VARIANTS_CACHE_TIMEOUT if ready else MISSING_VARIANTS_CACHE_TIMEOUT)
+    return ready
+
+
+def original_root(name):
+    # images/apple.thumb.webp -> images/apple, the original's name without its extension
+    return name.rsplit(".", 2)[0] if is_variant(name) else os.path.splitext(name)[0]
+
+
+def _render(image, size, fmt):
+    resized = image.copy()
+    resized.thumbnail(size, Image.LANCZOS)
+    if fmt == "jpeg" and resized.mode != "RGB":
+        # jpeg has no alpha channel, transparent areas become white
+        background = Image.new("RGB", resized.size, (255, 255, 255))
+        background.paste(resized, mask=resized.getchannel("A") if "A" in resized.getbands() else None)
+        resized = background
+    buffer = BytesIO()
+    resized.save(buffer, **FORMATS[fmt])
+    return ContentFile(buffer.getvalue())
+
+
+def generate(storage, name, overwrite=True):
+    if not storage.exists(name):
+        return []
+
+    try:
+        with storage.open(name, "rb") as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (UnidentifiedImageError, OSError):
+        return []
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    written = []
+    for variant, size in VARIANTS.items():
+        for fmt in FORMATS:
+            target = variant_name(name, variant, fmt)
+            if storage.exists(target):
+                if not overwrite:
+                    continue
+                storage.delete(target)
+            written.append(storage.save(target, _render(image, size, fmt)))
+    cache.set(_variants_key(name), True, VARIANTS_CACHE_TIMEOUT)
+    return written
+
+
+def generate_variants(field_file, overwrite=False):
+    if not field_file or not field_file.name:
+        return []
+    return generate(field_file.storage, field_file.name, overwrite)
+
+
+def variant_url(field_file, variant, fmt="webp"):
+    # falls back to the original until the variants exist, e.g. before the backfill ran
+    if not field_file or not field_file.name:
+        return ""
+    if has_variants(field_file.storage, field_file.name):
+        return field_file.storage.url(variant_name(field_file.name, variant, fmt))
+    return field_file.url
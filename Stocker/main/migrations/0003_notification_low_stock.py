@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_notification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('expiry', 'Expiry alert'), ('low_stock', 'Low stock alert')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def seed_counters(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    Category = apps.get_model('main', 'Category')
+    Supplier = apps.get_model('main', 'Supplier')
+    User = apps.get_model('auth', 'User')
+    InventoryCounter = apps.get_model('main', 'InventoryCounter')
+
+    threshold = settings.LOW_STOCK_THRESHOLD
+    values = Product.objects.aggregate(
+        products=Count('id'),
+        in_stock=Count('id', filter=Q(stock__gt=threshold)),
+        low_stock=Count('id', filter=Q(stock__lt=threshold)),
+        out_of_stock=Count('id', filter=Q(stock=0)),
+    )
+    values['categories'] = Category.objects.count()
+    values['suppliers'] = Supplier.objects.count()
+    values['users'] = User.objects.filter(is_superuser=False).count()
+
+    InventoryCounter.objects.bulk_create([
+        InventoryCounter(name=name, value=value) for name, value in values.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0003_notification_low_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
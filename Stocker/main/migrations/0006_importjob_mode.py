@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='mode',
+            field=models.CharField(choices=[('create', 'Create new products'), ('upsert', 'Update existing products by ID or title and category')], default='create', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='rows_updated',
+            field=models.IntegerField(default=0),
+        ),
+    ]
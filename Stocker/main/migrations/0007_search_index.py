@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE main_product_search USING fts5("
+        "title, description, category, suppliers, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE main_supplier_search USING fts5("
+        "name, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE main_category_search USING fts5("
+        "title, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO main_product_search (rowid, title, description, category, suppliers) "
+        "SELECT p.id, p.title, p.description, c.title, COALESCE(("
+        "SELECT group_concat(s.name, ' ') FROM main_product_suppliers ps "
+        "JOIN main_supplier s ON s.id = ps.supplier_id WHERE ps.product_id = p.id"
+        "), '') FROM main_product p JOIN main_category c ON c.id = p.Category_id"
+    )
+    schema_editor.execute("INSERT INTO main_supplier_search (rowid, name) SELECT id, name FROM main_supplier")
+    schema_editor.execute("INSERT INTO main_category_search (rowid, title) SELECT id, title FROM main_category")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in ('main_product_search', 'main_supplier_search', 'main_category_search'):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_importjob_mode'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['title'], name='category_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock', 'id'], name='product_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['expire_date'], name='product_expire_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['created_at', 'id'], name='supplier_created_idx'),
+        ),
+        # the users listing pages over (date_joined, id) on the auth table
+        migrations.RunSQL(
+            'CREATE INDEX user_date_joined_idx ON auth_user (date_joined, id)',
+            'DROP INDEX user_date_joined_idx',
+        ),
+    ]
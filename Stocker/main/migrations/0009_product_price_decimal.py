@@ -0,0 +1,72 @@
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+MAX_PRICE = Decimal('9999999999.99')
+
+
+def parse_price(value):
+    try:
+        price = Decimal(str(value).strip().replace('$', '').replace(',', ''))
+    except InvalidOperation:
+        return None
+    if not price.is_finite() or abs(price) > MAX_PRICE:
+        return None
+    return price.quantize(Decimal('0.01'))
+
+
+def convert_prices(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    db_alias = schema_editor.connection.alias
+    products = Product.objects.using(db_alias)
+
+    # every batch commits on its own so the table is never locked for the whole conversion
+    last_id = 0
+    invalid = []
+    while True:
+        batch = list(products.filter(id__gt=last_id).order_by('id').values_list('id', 'price')[:BATCH_SIZE])
+        if not batch:
+            break
+        converted = []
+        for product_id, raw in batch:
+            price = parse_price(raw)
+            if price is None:
+                invalid.append((product_id, raw))
+                price = Decimal('0.00')
+            converted.append(Product(id=product_id, price_decimal=price))
+        with transaction.atomic(using=db_alias):
+            products.bulk_update(converted, ['price_decimal'])
+        last_id = batch[-1][0]
+
+    if invalid:
+        logger.warning(
+            "%d unparseable prices set to 0.00: %s",
+            len(invalid), ", ".join(f"product {product_id} {raw!r}" for product_id, raw in invalid),
+        )
+
+
+def restore_prices(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    db_alias = schema_editor.connection.alias
+    Product.objects.using(db_alias).update(price=models.functions.Cast('price_decimal', models.CharField()))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('main', '0008_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='price_decimal',
+            field=models.DecimalField(decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(convert_prices, restore_prices),
+    ]
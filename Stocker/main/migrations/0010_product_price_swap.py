@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_product_price_decimal'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='product',
+            name='price',
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='price_decimal',
+            new_name='price',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0010_product_price_swap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('set', 'Stock count'), ('delta', 'Stock change')], max_length=20)),
+                ('delta', models.IntegerField()),
+                ('stock_after', models.IntegerField()),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='movement_product_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('set', 'Stock count'), ('delta', 'Stock change'), ('import', 'CSV import')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='StockRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('movements', models.IntegerField(default=0)),
+                ('stock_in', models.BigIntegerField(default=0)),
+                ('stock_out', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_rollups', to='main.category')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_rollups', to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'period_start'], name='rollup_period_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('product__isnull', False)), fields=('product', 'period', 'period_start'), name='rollup_product_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('category', 'period', 'period_start'), name='rollup_category_unique'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_stock_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['name'], name='supplier_name_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_supplier_name_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['created_at', 'id'], name='category_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_category_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import main.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_notification_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySearchEntry',
+            fields=[
+                ('category', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='main.category')),
+                ('document', main.models.SearchDocumentField(db_column='main_category_search')),
+            ],
+            options={
+                'db_table': 'main_category_search',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='main.product')),
+                ('document', main.models.SearchDocumentField(db_column='main_product_search')),
+            ],
+            options={
+                'db_table': 'main_product_search',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SupplierSearchEntry',
+            fields=[
+                ('supplier', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='main.supplier')),
+                ('document', main.models.SearchDocumentField(db_column='main_supplier_search')),
+            ],
+            options={
+                'db_table': 'main_supplier_search',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
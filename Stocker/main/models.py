@@ -1,16 +1,43 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 
+class CategoryQuerySet(models.QuerySet):
+    def with_products_count(self):
+        return self.annotate(products_count=related_count(Product, 'Category'))
+
+
 class Category(models.Model):
     title= models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    objects = CategoryQuerySet.as_manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['title'], name='category_title_idx'),
+            models.Index(fields=['created_at', 'id'], name='category_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
             
 
 
 
+def related_count(through, field):
+    # counted in a correlated subquery so filters on the same m2m relation don't narrow the count
+    counts = through.objects.filter(**{field: OuterRef('pk')}).values(field).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+class SupplierQuerySet(models.QuerySet):
+    def with_products_count(self):
+        return self.annotate(products_count=related_count(Product.suppliers.through, 'supplier'))
+
+
 class Supplier(models.Model):
     name = models.CharField(max_length=100)
     logo = models.ImageField(upload_to="logos/",default='logos/default.jpg')
@@ -18,27 +45,252 @@ class Supplier(models.Model):
     website = models.URLField()
     phone = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    objects = SupplierQuerySet.as_manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='supplier_created_idx'),
+            models.Index(fields=['name'], name='supplier_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
             
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_list_data(self):
+        return self.select_related('Category').annotate(
+            suppliers_count=related_count(Product.suppliers.through, 'product')
+        )
+
+
 class Product(models.Model):
     title=models.CharField(max_length=100)
     description= models.TextField()
     image = models.ImageField(upload_to="images/",default='images/default.jpg')
-    price = models.CharField(max_length=20, default="0")
+    price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     stock = models.IntegerField(default=0)
     Category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="product_category")
     suppliers = models.ManyToManyField(Supplier)
     expire_date = models.DateField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    objects = ProductQuerySet.as_manager()
     class Meta:
         permissions = [
             ('view_stock', 'Can view stock'),
             ('update_stock', 'Can update stock'),
         ]
+        indexes = [
+            models.Index(fields=['stock', 'id'], name='product_stock_idx'),
+            models.Index(fields=['expire_date'], name='product_expire_date_idx'),
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
             
+
+
+class Notification(models.Model):
+    KIND_EXPIRY = 'expiry'
+    KIND_LOW_STOCK = 'low_stock'
+    KIND_CHOICES = [
+        (KIND_EXPIRY, 'Expiry alert'),
+        (KIND_LOW_STOCK, 'Low stock alert'),
+    ]
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="notifications")
+    recipient = models.EmailField()
+    alert_date = models.DateField()
+    dedupe_key = models.CharField(max_length=200, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} alert for {self.product_id} to {self.recipient}"
+
+
+class InventoryCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class ImportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    MODE_CREATE = 'create'
+    MODE_UPSERT = 'upsert'
+    MODE_CHOICES = [
+        (MODE_CREATE, 'Create new products'),
+        (MODE_UPSERT, 'Update existing products by ID or title and category'),
+    ]
+    file = models.FileField(upload_to="imports/")
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default=MODE_CREATE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    rows_processed = models.IntegerField(default=0)
+    rows_created = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    errors = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # the worker running the job and its last sign of life, see importers.claim_jobs
+    claimed_by = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0
+
+    def __str__(self):
+        return f"import {self.id} ({self.status})"
+
+
+class StockMovement(models.Model):
+    KIND_SET = 'set'
+    KIND_DELTA = 'delta'
+    KIND_IMPORT = 'import'
+    KIND_CHOICES = [
+        (KIND_SET, 'Stock count'),
+        (KIND_DELTA, 'Stock change'),
+        (KIND_IMPORT, 'CSV import'),
+    ]
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="movements")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    delta = models.IntegerField()
+    stock_after = models.IntegerField()
+    note = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='movement_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.delta:+d} for {self.product_id} ({self.kind})"
+
+
+class StockRollup(models.Model):
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+    PERIOD_CHOICES = [
+        (PERIOD_DAY, 'Day'),
+        (PERIOD_WEEK, 'Week'),
+    ]
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name="stock_rollups")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name="stock_rollups")
+    movements = models.IntegerField(default=0)
+    stock_in = models.BigIntegerField(default=0)
+    stock_out = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'period', 'period_start'], condition=Q(product__isnull=False), name='rollup_product_unique'),
+            models.UniqueConstraint(fields=['category', 'period', 'period_start'], condition=Q(category__isnull=False), name='rollup_category_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'period_start'], name='rollup_period_idx'),
+        ]
+
+    @property
+    def net_change(self):
+        return self.stock_in - self.stock_out
+
+    def __str__(self):
+        scope = f"product {self.product_id}" if self.product_id else f"category {self.category_id}"
+        return f"{self.period} {self.period_start} for {scope}"
+
+
+class RollupCursor(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.last_id}"
+
+
+class SearchDocumentField(models.TextField):
+    # the hidden FTS5 column named after its table, filtered with the match lookup below
+    pass
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    # "=" on the hidden column also matches, but SQLite then loses the FTS cursor for bm25()
+    # inside an OR, which the keyset pagination of ranked results needs
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchEntry(models.Model):
+    # a row of the FTS5 tables from migration 0007, joined on rowid so a search is matched and
+    # ranked in one pass
+    class Meta:
+        abstract = True
+        managed = False
+
+
+class ProductSearchEntry(SearchEntry):
+    product = models.OneToOneField(Product, models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False, related_name='search_entry')
+    document = SearchDocumentField(db_column='main_product_search')
+    class Meta(SearchEntry.Meta):
+        db_table = 'main_product_search'
+
+
+class SupplierSearchEntry(SearchEntry):
+    supplier = models.OneToOneField(Supplier, models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False, related_name='search_entry')
+    document = SearchDocumentField(db_column='main_supplier_search')
+    class Meta(SearchEntry.Meta):
+        db_table = 'main_supplier_search'
+
+
+class CategorySearchEntry(SearchEntry):
+    category = models.OneToOneField(Category, models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False, related_name='search_entry')
+    document = SearchDocumentField(db_column='main_category_search')
+    class Meta(SearchEntry.Meta):
+        db_table = 'main_category_search'
@@ -0,0 +1,198 @@
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import models
+
+# rows a sender claimed but never recorded a result for are handed to the next sender after this long
+CLAIM_SECONDS = 600
+
+
+def manager_emails():
+    if settings.ALERT_RECIPIENTS:
+        return list(settings.ALERT_RECIPIENTS)
+    return list(
+        User.objects.filter(is_superuser=True).exclude(email="").values_list("email", flat=True)
+    )
+
+
+def _enqueue(kind, product_ids, today):
+    recipients = manager_emails()
+    notifications = [
+        models.Notification(
+            kind=kind,
+            product_id=product_id,
+            recipient=recipient,
+            alert_date=today,
+            dedupe_key=f"{kind}:{product_id}:{today.isoformat()}:{recipient}",
+        )
+        for product_id in product_ids
+        for recipient in recipients
+    ]
+    models.Notification.objects.bulk_create(notifications, batch_size=500, ignore_conflicts=True)
+    return len(notifications)
+
+
+def enqueue_expiry_alerts():
+    today = timezone.now().date()
+
+    # the outbox dedupes per product per day, so only the first login of the day has work to do
+    gate = f"expiry-alerts:{today.isoformat()}"
+    if not cache.add(gate, True, 60 * 60 * 24):
+        return 0
+
+    try:
+        product_ids = models.Product.objects.filter(
+            expire_date__lte=today + timedelta(days=settings.EXPIRY_ALERT_DAYS),
+            expire_date__gte=today
+        ).values_list("id", flat=True)
+        return _enqueue(models.Notification.KIND_EXPIRY, product_ids, today)
+    except Exception:
+        # nothing was queued, the next login tries again
+        cache.delete(gate)
+        raise
+
+
+def enqueue_low_stock_alerts(product_ids):
+    return _enqueue(models.Notification.KIND_LOW_STOCK, product_ids, timezone.now().date())
+
+
+def _alert_context(notification:models.Notification, today):
+    return {
+        "product": notification.product,
+        "alert_date": notification.alert_date,
+        "days_until_expiry": (notification.product.expire_date - today).days,
+    }
+
+
+def render_notification(notification:models.Notification):
+    context = _alert_context(notification, timezone.now().date())
+    if notification.kind == models.Notification.KIND_LOW_STOCK:
+        context["threshold"] = settings.LOW_STOCK_THRESHOLD
+        return "Low Stock Alert", render_to_string("emails/low_stock_alert.html", context)
+    return "Product Expiry Alert", render_to_string("emails/expiry_alert.html", context)
+
+
+def _deliver(emails):
+    # one SMTP session for every message instead of one per message
+    connection = get_connection()
+    connection.open()
+    try:
+        for email in emails:
+            email.connection = connection
+            try:
+                email.send()
+            except Exception as e:
+                yield email, e
+            else:
+                yield email, None
+    finally:
+        connection.close()
+
+
+def _record_result(notification:models.Notification, error, max_attempts):
+    if error is None:
+        notification.status = models.Notification.STATUS_SENT
+        notification.sent_at = timezone.now()
+        return
+    notification.attempts += 1
+    notification.last_error = str(error)
+    if notification.attempts >= max_attempts:
+        notification.status = models.Notification.STATUS_FAILED
+    else:
+        notification.status = models.Notification.STATUS_PENDING
+
+
+def claim_pending(limit=None, claim_seconds=CLAIM_SECONDS):
+    # send_notifications and send_alert_digest may drain the outbox at the same time,
+    # the conditional update hands every row to one sender only
+    token = uuid.uuid4().hex
+    claimable = Q(status=models.Notification.STATUS_PENDING) | Q(
+        status=models.Notification.STATUS_SENDING, claimed_at__lt=timezone.now() - timedelta(seconds=claim_seconds)
+    )
+    ids = models.Notification.objects.filter(claimable).order_by("id").values_list("id", flat=True)
+    if limit is not None:
+        ids = ids[:limit]
+    models.Notification.objects.filter(claimable, id__in=list(ids)).update(
+        status=models.Notification.STATUS_SENDING, claimed_by=token, claimed_at=timezone.now()
+    )
+    return list(
+        models.Notification.objects.filter(status=models.Notification.STATUS_SENDING, claimed_by=token)
+        .select_related("product")
+        .order_by("id")
+    )
+
+
+def send_pending_notifications(batch_size=100, max_attempts=5):
+    pending = claim_pending(batch_size)
+    if not pending:
+        return 0, 0
+
+    emails = []
+    for notification in pending:
+        subject, content = render_notification(notification)
+        email = EmailMessage(subject, content, settings.DEFAULT_FROM_EMAIL, [notification.recipient])
+        email.content_subtype = "html"
+        emails.append(email)
+
+    sent = failed = 0
+    for (email, error), notification in zip(_deliver(emails), pending):
+        _record_result(notification, error, max_attempts)
+        if error is None:
+            sent += 1
+        else:
+            failed += 1
+
+    models.Notification.objects.bulk_update(pending, ["status", "attempts", "last_error", "sent_at"])
+    return sent, failed
+
+
+def send_alert_digest(max_attempts=5):
+    pending = claim_pending()
+    if not pending:
+        return 0, 0
+
+    today = timezone.now().date()
+    by_recipient = defaultdict(list)
+    for notification in pending:
+        by_recipient[notification.recipient].append(notification)
+
+    emails = []
+    for recipient, alerts in by_recipient.items():
+        content = render_to_string("emails/alert_digest.html", {
+            "expiring": [
+                _alert_context(alert, today) for alert in alerts
+                if alert.kind == models.Notification.KIND_EXPIRY
+            ],
+            "low_stock": [
+                _alert_context(alert, today) for alert in alerts
+                if alert.kind == models.Notification.KIND_LOW_STOCK
+            ],
+            "threshold": settings.LOW_STOCK_THRESHOLD,
+        })
+        email = EmailMessage(
+            f"Stocker Alerts Digest ({len(alerts)} alerts)",
+            content,
+            settings.DEFAULT_FROM_EMAIL,
+            [recipient],
+        )
+        email.content_subtype = "html"
+        emails.append(email)
+
+    sent = 0
+    for email, error in _deliver(emails):
+        for notification in by_recipient[email.to[0]]:
+            _record_result(notification, error, max_attempts)
+        if error is None:
+            sent += 1
+
+    models.Notification.objects.bulk_update(pending, ["status", "attempts", "last_error", "sent_at"], batch_size=500)
+    return sent, len(pending)
@@ -0,0 +1,128 @@
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+
+COUNT_CACHE_TIMEOUT = 60
+
+
+def _serialize(value):
+    # full precision, DjangoJSONEncoder truncates microseconds and the cursor would skip rows
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values, direction):
+    data = json.dumps({"v": values, "d": direction}, default=_serialize)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return list(data["v"]), data["d"]
+    except (ValueError, KeyError, TypeError):
+        return None, None
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    # listings show an approximate total, an exact COUNT(*) per page view is not worth it
+    if queryset.query.is_empty():
+        return 0
+    key = "count:" + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+class CursorPage:
+
+    def __init__(self, object_list, total_count, next_query=None, previous_query=None):
+        self.object_list = object_list
+        self.total_count = total_count
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def has_next(self):
+        return self.next_query is not None
+
+    def has_previous(self):
+        return self.previous_query is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class CursorPaginator:
+    # keyset pagination: pages are fetched with WHERE (a, b) > (last a, last b) instead of OFFSET
+
+    def __init__(self, queryset, ordering, per_page=10, count=None):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.count = count
+
+    def _fields(self):
+        return [(field.lstrip("-"), field.startswith("-")) for field in self.ordering]
+
+    def _seek(self, values, backwards):
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self._fields(), values):
+            lookup = "lt" if descending != backwards else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _values(self, obj):
+        return [getattr(obj, name) for name, descending in self._fields()]
+
+    def _query(self, request, token):
+        params = request.GET.copy()
+        params.pop("page", None)
+        params["cursor"] = token
+        return params.urlencode()
+
+    def get_page(self, request):
+        values, direction = decode_cursor(request.GET.get("cursor", ""))
+        if values is not None and len(values) != len(self.ordering):
+            values = None
+        backwards = values is not None and direction == "prev"
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        if backwards:
+            ordering = [field[1:] if field.startswith("-") else "-" + field for field in self.ordering]
+        else:
+            ordering = self.ordering
+
+        # one extra row tells whether there is another page in this direction
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_query = previous_query = None
+        if rows:
+            if has_more or backwards:
+                next_query = self._query(request, encode_cursor(self._values(rows[-1]), "next"))
+            if (has_more and backwards) or (values is not None and not backwards):
+                previous_query = self._query(request, encode_cursor(self._values(rows[0]), "prev"))
+
+        count = self.count
+        if count is None:
+            count = cached_count(self.queryset)
+        return CursorPage(rows, count, next_query, previous_query)
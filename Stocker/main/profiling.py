@@ -0,0 +1,124 @@
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.utils import timezone
+
+logger = logging.getLogger("stocker.profiling")
+
+_current = contextvars.ContextVar("profile", default=None)
+_template_render = django_backend.Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    profile = _current.get()
+    if profile is None:
+        return _template_render(self, context, request)
+    # only the top level render() of the backend is wrapped, includes are counted inside it
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        profile.template_seconds += time.perf_counter() - start
+
+
+class Profile:
+
+    def __init__(self):
+        self.queries = []
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context["connection"].alias, sql, repr(params), time.perf_counter() - start))
+
+    def sql_seconds(self):
+        return sum(query[3] for query in self.queries)
+
+    def duplicates(self):
+        # identical statement and parameters run more than once in the same request
+        counts = Counter((alias, sql, params) for alias, sql, params, seconds in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    def repeated(self):
+        # the same statement with different parameters, an N+1 shows up as one statement run per row
+        counts = Counter(sql for alias, sql, params, seconds in self.queries)
+        return [
+            {"sql": sql[:300], "count": count}
+            for sql, count in counts.most_common()
+            if count >= settings.PROFILING_REPEAT_THRESHOLD
+        ]
+
+
+class ProfilingMiddleware:
+    # enabled with PROFILING=1, see settings.py. Every profiled request is logged as one JSON line on
+    # the stocker.profiling logger and summarised in a Server-Timing header, profiling_report aggregates the log
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        django_backend.Template.render = _timed_render
+        if settings.PROFILING_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        if settings.PROFILING_MEMORY:
+            # the peak is process wide, it is only exact when a worker serves one request at a time
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            with self.wrap_connections(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_seconds = time.perf_counter() - start
+
+        record = {
+            "ts": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "view": request.resolver_match.view_name if request.resolver_match else None,
+            "status": response.status_code,
+            "total_ms": round(total_seconds * 1000, 2),
+            "sql_count": len(profile.queries),
+            "sql_ms": round(profile.sql_seconds() * 1000, 2),
+            "duplicate_queries": profile.duplicates(),
+            "repeated_queries": profile.repeated(),
+            "template_ms": round(profile.template_seconds * 1000, 2),
+        }
+        if settings.PROFILING_MEMORY:
+            record["peak_memory_kb"] = round((tracemalloc.get_traced_memory()[1] - memory_before) / 1024, 1)
+        logger.info(json.dumps(record))
+
+        # streaming responses are timed until the view returns, the body is produced later
+        timings = [
+            f"total;dur={record['total_ms']}",
+            f"sql;dur={record['sql_ms']};desc=\"{record['sql_count']} queries, {record['duplicate_queries']} duplicates\"",
+            f"template;dur={record['template_ms']}",
+        ]
+        if settings.PROFILING_MEMORY:
+            timings.append(f"memory;desc=\"peak {record['peak_memory_kb']} KB\"")
+        response["Server-Timing"] = ", ".join(timings)
+        return response
+
+    def wrap_connections(self, profile):
+        stack = contextlib.ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+        return stack
@@ -0,0 +1,31 @@
+from django.db import connection
+
+# full scans that are expected, every other SELECT the views issue has to use an index.
+# (url name, table), a url name of None allows the scan on every view
+ALLOWED_SCANS = {
+    # a handful of counter rows, always read whole
+    (None, "main_inventorycounter"),
+    # the dashboard aggregates every supplier, the result is cached in the dashboard snapshot
+    ("main:home_view", "main_supplier"),
+}
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return [row[3] for row in cursor.fetchall()]
+
+
+def is_full_scan(detail):
+    # "SCAN table" without an index is a full table scan, index, FTS and derived table scans are fine
+    if not detail.startswith("SCAN ") or "USING" in detail or "VIRTUAL TABLE" in detail:
+        return False
+    return detail.split()[1] not in ("subquery", "CONSTANT") and not detail.startswith("SCAN (")
+
+
+def full_scans(sql):
+    return [detail.split()[1] for detail in explain(sql) if is_full_scan(detail)]
+
+
+def is_allowed(url_name, table):
+    return (None, table) in ALLOWED_SCANS or (url_name, table) in ALLOWED_SCANS
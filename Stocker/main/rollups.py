@@ -0,0 +1,148 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import models
+
+CURSOR_NAME = "stock_movements"
+CHUNK_SIZE = 5000
+
+# movements younger than this may still belong to an open transaction with a lower id, they wait for the next run
+SETTLE_SECONDS = 60
+
+SCOPES = ("product", "category")
+
+
+def period_starts(day):
+    return {
+        models.StockRollup.PERIOD_DAY: day,
+        models.StockRollup.PERIOD_WEEK: day - timedelta(days=day.weekday()),
+    }
+
+
+def _totals(movements):
+    totals = defaultdict(lambda: [0, 0, 0])
+    for movement_id, product_id, category_id, delta, created_at in movements:
+        day = timezone.localtime(created_at).date()
+        for period, start in period_starts(day).items():
+            for scope, scope_id in (("product", product_id), ("category", category_id)):
+                total = totals[(scope, scope_id, period, start)]
+                total[0] += 1
+                total[1] += max(delta, 0)
+                total[2] += max(-delta, 0)
+    return totals
+
+
+def _merge(totals):
+    for scope in SCOPES:
+        keys = [key for key in totals if key[0] == scope]
+        if not keys:
+            continue
+        existing = {
+            (scope, getattr(rollup, f"{scope}_id"), rollup.period, rollup.period_start): rollup
+            for rollup in models.StockRollup.objects.filter(**{
+                f"{scope}_id__in": {key[1] for key in keys},
+                "period_start__in": {key[3] for key in keys},
+            })
+        }
+
+        to_create = []
+        to_update = []
+        for key in keys:
+            movements, stock_in, stock_out = totals[key]
+            rollup = existing.get(key)
+            if rollup is None:
+                to_create.append(models.StockRollup(
+                    **{f"{scope}_id": key[1]},
+                    period=key[2],
+                    period_start=key[3],
+                    movements=movements,
+                    stock_in=stock_in,
+                    stock_out=stock_out,
+                ))
+            else:
+                rollup.movements += movements
+                rollup.stock_in += stock_in
+                rollup.stock_out += stock_out
+                rollup.updated_at = timezone.now()
+                to_update.append(rollup)
+
+        models.StockRollup.objects.bulk_create(to_create, batch_size=500)
+        models.StockRollup.objects.bulk_update(to_update, ["movements", "stock_in", "stock_out", "updated_at"], batch_size=500)
+
+
+def build(chunk_size=CHUNK_SIZE):
+    # incremental: only movements after the stored cursor are read, each chunk commits with the cursor
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    models.RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            cursor = models.RollupCursor.objects.select_for_update().get(name=CURSOR_NAME)
+            movements = list(
+                models.StockMovement.objects.filter(id__gt=cursor.last_id).order_by("id").values_list(
+                    "id", "product_id", "product__Category_id", "delta", "created_at"
+                )[:chunk_size]
+            )
+            for position, movement in enumerate(movements):
+                if movement[4] >= settled:
+                    movements = movements[:position]
+                    break
+            if not movements:
+                break
+
+            _merge(_totals(movements))
+            cursor.last_id = movements[-1][0]
+            cursor.save(update_fields=["last_id", "updated_at"])
+        processed += len(movements)
+    return processed
+
+
+def trend(days=14):
+    # summed over the category rollups, the raw movements are never scanned
+    today = timezone.localtime().date()
+    since = today - timedelta(days=days - 1)
+    rows = {
+        row["period_start"]: row
+        for row in models.StockRollup.objects.filter(
+            period=models.StockRollup.PERIOD_DAY, period_start__gte=since, category__isnull=False
+        ).values("period_start").annotate(
+            movements=Sum("movements"), stock_in=Sum("stock_in"), stock_out=Sum("stock_out")
+        )
+    }
+    return [
+        rows.get(since + timedelta(days=offset), {"period_start": since + timedelta(days=offset), "movements": 0, "stock_in": 0, "stock_out": 0})
+        for offset in range(days)
+    ]
+
+
+def history(since, period=models.StockRollup.PERIOD_DAY, product_id=None, category_id=None):
+    if product_id is not None:
+        scope, scope_id, movement_scope = "product", product_id, {"product_id": product_id}
+    else:
+        scope, scope_id, movement_scope = "category", category_id, {"product__Category_id": category_id}
+
+    rows = {
+        row["period_start"]: row
+        for row in models.StockRollup.objects.filter(
+            period=period, period_start__gte=since, **{f"{scope}_id": scope_id}
+        ).values("period_start", "movements", "stock_in", "stock_out")
+    }
+
+    # the movements the last build hasn't folded in yet, read by id from the cursor on
+    last_id = models.RollupCursor.objects.filter(name=CURSOR_NAME).values_list("last_id", flat=True).first() or 0
+    tail = models.StockMovement.objects.filter(id__gt=last_id, **movement_scope).values_list(
+        "id", "product_id", "product__Category_id", "delta", "created_at"
+    )
+    for (total_scope, total_id, total_period, start), (movements, stock_in, stock_out) in _totals(tail).items():
+        if total_scope != scope or total_period != period or start < since:
+            continue
+        row = rows.setdefault(start, {"period_start": start, "movements": 0, "stock_in": 0, "stock_out": 0})
+        row["movements"] += movements
+        row["stock_in"] += stock_in
+        row["stock_out"] += stock_out
+
+    return [rows[start] for start in sorted(rows)]
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = "replica"
+PIN_SESSION_KEY = "db_pinned_until"
+
+# url names of the pages that only read, everything else stays on the primary
+READ_ONLY_VIEWS = {
+    "home_view",
+    "products_view",
+    "categories_view",
+    "suppliers_view",
+    "supplier_products_view",
+    "product_suppliers_view",
+    "export_products",
+    "stock_history",
+    "choice_options",
+}
+
+_state = threading.local()
+
+
+def use_replica():
+    return getattr(_state, "use_replica", False)
+
+
+class ReplicaRouter:
+    # reads of the app's own tables go to the replica while a read-only page is served,
+    # sessions, users and permissions always come from the primary
+
+    def db_for_read(self, model, **hints):
+        if use_replica() and model._meta.app_label == "main":
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # a page that writes reads its own rows back from the primary for the rest of the request
+        _state.use_replica = False
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def _replica_stream(content):
+    # streamed responses are consumed after the middleware returned, so the routing is set again while iterating
+    _state.use_replica = True
+    try:
+        yield from content
+    finally:
+        _state.use_replica = False
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = REPLICA in settings.DATABASES
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        _state.use_replica = False
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            if _state.wrote or request.method not in ("GET", "HEAD", "OPTIONS"):
+                request.session[PIN_SESSION_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+            elif response.streaming and _state.use_replica:
+                response.streaming_content = _replica_stream(response.streaming_content)
+            return response
+        finally:
+            _state.use_replica = False
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled or request.method not in ("GET", "HEAD"):
+            return None
+        if request.resolver_match.url_name not in READ_ONLY_VIEWS:
+            return None
+        if request.session.get(PIN_SESSION_KEY, 0) > time.time():
+            return None
+        _state.use_replica = True
+        return None
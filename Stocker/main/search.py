@@ -0,0 +1,135 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from . import models
+
+PRODUCT_INDEX = "main_product_search"
+SUPPLIER_INDEX = "main_supplier_search"
+CATEGORY_INDEX = "main_category_search"
+
+# weights for the title, description, category and suppliers columns
+PRODUCT_WEIGHTS = "10.0, 1.0, 3.0, 2.0"
+
+CHUNK_SIZE = 500
+
+MIN_MATCH_LENGTH = 4
+
+
+def enabled():
+    return connection.vendor == "sqlite"
+
+
+def match_query(term):
+    # every word becomes a quoted prefix query so user input can't inject FTS syntax
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", term))
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _placeholders(ids):
+    return ", ".join(["%s"] * len(ids))
+
+
+def remove(index, ids):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            cursor.execute(f"DELETE FROM {index} WHERE rowid IN ({_placeholders(chunk)})", chunk)
+
+
+def index_products(ids):
+    if not enabled():
+        return
+    remove(PRODUCT_INDEX, ids)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            cursor.execute(
+                f"""
+                INSERT INTO {PRODUCT_INDEX} (rowid, title, description, category, suppliers)
+                SELECT p.id, p.title, p.description, c.title, COALESCE((
+                    SELECT group_concat(s.name, ' ')
+                    FROM main_product_suppliers ps JOIN main_supplier s ON s.id = ps.supplier_id
+                    WHERE ps.product_id = p.id
+                ), '')
+                FROM main_product p JOIN main_category c ON c.id = p.Category_id
+                WHERE p.id IN ({_placeholders(chunk)})
+                """,
+                chunk,
+            )
+
+
+def index_suppliers(ids):
+    if not enabled():
+        return
+    remove(SUPPLIER_INDEX, ids)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            cursor.execute(
+                f"INSERT INTO {SUPPLIER_INDEX} (rowid, name) SELECT id, name FROM main_supplier WHERE id IN ({_placeholders(chunk)})",
+                chunk,
+            )
+
+
+def index_categories(ids):
+    if not enabled():
+        return
+    remove(CATEGORY_INDEX, ids)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            cursor.execute(
+                f"INSERT INTO {CATEGORY_INDEX} (rowid, title) SELECT id, title FROM main_category WHERE id IN ({_placeholders(chunk)})",
+                chunk,
+            )
+
+
+def rebuild():
+    with connection.cursor() as cursor:
+        for index in (PRODUCT_INDEX, SUPPLIER_INDEX, CATEGORY_INDEX):
+            cursor.execute(f"DELETE FROM {index}")
+    index_products(models.Product.objects.values_list("id", flat=True))
+    index_suppliers(models.Supplier.objects.values_list("id", flat=True))
+    index_categories(models.Category.objects.values_list("id", flat=True))
+
+
+def _search(queryset, entry, term, weights, fallback_lookup):
+    query = match_query(term)
+    if not query:
+        return queryset.order_by("id")
+    # a short prefix matches a large share of the rows and ranking all of them costs more
+    # than the LIKE scan it replaces, so those terms keep the plain lookup
+    if not enabled() or max(len(word) for word in re.findall(r"\w+", term)) < MIN_MATCH_LENGTH:
+        return queryset.filter(**{fallback_lookup: term}).order_by("id")
+
+    index = entry._meta.db_table
+    rank = f"bm25({index}, {weights})" if weights else f"{index}.rank"
+    # the index is joined through its entry model so the match and the ranking run once per
+    # query, a correlated rank subquery re-runs the full text query for every matching row
+    return queryset.filter(search_entry__document__match=query).annotate(
+        search_rank=RawSQL(rank, [], output_field=FloatField())
+    ).order_by("search_rank", "id")
+
+
+def search_products(queryset, term):
+    return _search(queryset, models.ProductSearchEntry, term, PRODUCT_WEIGHTS, "title__icontains")
+
+
+def search_suppliers(queryset, term):
+    return _search(queryset, models.SupplierSearchEntry, term, None, "name__icontains")
+
+
+def search_categories(queryset, term):
+    return _search(queryset, models.CategorySearchEntry, term, None, "title__icontains")
+
+
+def ordering(queryset, default):
+    if "search_rank" in queryset.query.annotations:
+        return ("search_rank", "id")
+    return default
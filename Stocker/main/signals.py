@@ -0,0 +1,187 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import auth, caching, choices, counters, dashboard, models, search
+
+COUNTER_NAMES = {
+    models.Category: counters.CATEGORIES,
+    models.Supplier: counters.SUPPLIERS,
+}
+
+# cached template fragments showing each model, the dashboard group is bumped by dashboard.invalidate()
+FRAGMENT_INVALIDATIONS = {
+    models.Product: ("products", "categories", "suppliers"),
+    models.Product.suppliers.through: ("products", "suppliers"),
+    models.Category: ("categories", "products"),
+    models.Supplier: ("suppliers", "products"),
+}
+
+# cached option lists of the product and user forms, see choices.py
+CHOICE_INVALIDATIONS = {
+    models.Category: "categories",
+    models.Supplier: "suppliers",
+    Group: "groups",
+}
+
+
+@receiver(pre_save, sender=models.Product)
+def remember_product_stock(sender, instance, **kwargs):
+    instance._previous_stock = None
+    if instance.pk:
+        instance._previous_stock = sender.objects.filter(pk=instance.pk).values_list("stock", flat=True).first()
+
+
+@receiver(post_save, sender=models.Product)
+def count_product_save(sender, instance, created, **kwargs):
+    deltas = counters.stock_deltas(instance._previous_stock, instance.stock)
+    if created or instance._previous_stock is None:
+        deltas[counters.PRODUCTS] = 1
+    counters.apply(deltas)
+
+
+@receiver(post_delete, sender=models.Product)
+def count_product_delete(sender, instance, **kwargs):
+    deltas = counters.stock_deltas(instance.stock, None)
+    deltas[counters.PRODUCTS] = -1
+    counters.apply(deltas)
+
+
+@receiver(post_save, sender=models.Category)
+@receiver(post_save, sender=models.Supplier)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        counters.apply({COUNTER_NAMES[sender]: 1})
+
+
+@receiver(post_delete, sender=models.Category)
+@receiver(post_delete, sender=models.Supplier)
+def count_deleted(sender, instance, **kwargs):
+    counters.apply({COUNTER_NAMES[sender]: -1})
+
+
+@receiver(pre_save, sender=User)
+def remember_user_role(sender, instance, **kwargs):
+    instance._was_counted = None
+    if instance.pk:
+        is_superuser = sender.objects.filter(pk=instance.pk).values_list("is_superuser", flat=True).first()
+        if is_superuser is not None:
+            instance._was_counted = not is_superuser
+
+
+@receiver(post_save, sender=User)
+def count_user_save(sender, instance, **kwargs):
+    counted = not instance.is_superuser
+    if instance._was_counted is None:
+        delta = 1 if counted else 0
+    else:
+        delta = int(counted) - int(instance._was_counted)
+    counters.apply({counters.USERS: delta})
+
+
+@receiver(post_delete, sender=User)
+def count_user_delete(sender, instance, **kwargs):
+    if not instance.is_superuser:
+        counters.apply({counters.USERS: -1})
+
+
+
+@receiver(post_save, sender=models.Product)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance.id])
+
+
+@receiver(post_delete, sender=models.Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove(search.PRODUCT_INDEX, [instance.id])
+
+
+@receiver(m2m_changed, sender=models.Product.suppliers.through)
+def index_product_suppliers(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        search.index_products([instance.id])
+    elif pk_set:
+        search.index_products(pk_set)
+    else:
+        # clearing from the supplier side doesn't report the affected products
+        search.rebuild()
+
+
+@receiver(post_save, sender=models.Supplier)
+def index_supplier(sender, instance, created, **kwargs):
+    search.index_suppliers([instance.id])
+    if not created:
+        search.index_products(instance.product_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=models.Supplier)
+def remember_supplier_products(sender, instance, **kwargs):
+    instance._product_ids = list(instance.product_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=models.Supplier)
+def unindex_supplier(sender, instance, **kwargs):
+    search.remove(search.SUPPLIER_INDEX, [instance.id])
+    search.index_products(instance._product_ids)
+
+
+@receiver(post_save, sender=models.Category)
+def index_category(sender, instance, created, **kwargs):
+    search.index_categories([instance.id])
+    if not created:
+        search.index_products(instance.product_category.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=models.Category)
+def unindex_category(sender, instance, **kwargs):
+    search.remove(search.CATEGORY_INDEX, [instance.id])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_permissions(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        auth.invalidate()
+
+
+# registered last so the snapshot is rebuilt from the updated counters
+@receiver(post_save, sender=models.Product)
+@receiver(post_delete, sender=models.Product)
+@receiver(post_save, sender=models.Supplier)
+@receiver(post_delete, sender=models.Supplier)
+@receiver(post_save, sender=models.Category)
+@receiver(post_delete, sender=models.Category)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(m2m_changed, sender=models.Product.suppliers.through)
+def invalidate_dashboard(sender, **kwargs):
+    dashboard.invalidate()
+
+
+@receiver(post_save, sender=models.Product)
+@receiver(post_delete, sender=models.Product)
+@receiver(post_save, sender=models.Supplier)
+@receiver(post_delete, sender=models.Supplier)
+@receiver(post_save, sender=models.Category)
+@receiver(post_delete, sender=models.Category)
+@receiver(m2m_changed, sender=models.Product.suppliers.through)
+def invalidate_fragments(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        caching.invalidate(*FRAGMENT_INVALIDATIONS[sender])
+
+
+@receiver(post_save, sender=models.Category)
+@receiver(post_delete, sender=models.Category)
+@receiver(post_save, sender=models.Supplier)
+@receiver(post_delete, sender=models.Supplier)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_choices(sender, **kwargs):
+    choices.invalidate(CHOICE_INVALIDATIONS[sender])
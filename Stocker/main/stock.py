@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from . import caching, counters, dashboard, models, notifications
+
+MAX_MOVEMENTS = 1000
+MAX_BULK_ITEMS = 10000
+UPDATE_CHUNK_SIZE = 500
+
+
+class StockError(ValueError):
+    pass
+
+
+def parse_movement(data):
+    if not isinstance(data, dict):
+        raise StockError("a movement must be an object")
+    try:
+        product_id = int(data["product_id"])
+    except (KeyError, TypeError, ValueError):
+        raise StockError("product_id is required")
+
+    if ("stock" in data) == ("delta" in data):
+        raise StockError("give either stock or delta")
+    key = "stock" if "stock" in data else "delta"
+    kind = models.StockMovement.KIND_SET if key == "stock" else models.StockMovement.KIND_DELTA
+    value = data[key]
+    # int() would turn true into 1 and truncate 1.9, bool is a subclass of int so the type is compared exactly
+    if type(value) is not int:
+        raise StockError("stock and delta must be whole numbers")
+    if kind == models.StockMovement.KIND_SET and value < 0:
+        raise StockError("stock cannot be negative")
+
+    return {"product_id": product_id, "kind": kind, "value": value, "note": str(data.get("note", ""))[:200]}
+
+
+def _write_stock(previous, stock):
+    changed = [product_id for product_id, new_stock in stock.items() if new_stock != previous[product_id]]
+
+    # one UPDATE ... SET stock = CASE id WHEN .. per chunk, only the stock column is written
+    for start in range(0, len(changed), UPDATE_CHUNK_SIZE):
+        chunk = changed[start:start + UPDATE_CHUNK_SIZE]
+        models.Product.objects.filter(pk__in=chunk).update(stock=Case(
+            *[When(pk=product_id, then=F("stock") + (stock[product_id] - previous[product_id])) for product_id in chunk],
+            default=F("stock"),
+        ))
+
+    # update() skips the model signals, so counters and alerts are kept here, once per batch
+    deltas = {}
+    for product_id in changed:
+        for band, delta in counters.stock_deltas(previous[product_id], stock[product_id]).items():
+            deltas[band] = deltas.get(band, 0) + delta
+    counters.apply(deltas)
+
+    low = [product_id for product_id in changed if counters.is_low_stock(stock[product_id])]
+    if low:
+        notifications.enqueue_low_stock_alerts(low)
+
+
+def _apply(movements, user, strict, write=True):
+    ledger = []
+    failed = {}
+    with transaction.atomic():
+        # rows are locked in id order so concurrent batches can't deadlock on each other
+        product_ids = sorted({movement["product_id"] for index, movement in movements})
+        previous = dict(
+            models.Product.objects.select_for_update().filter(pk__in=product_ids).order_by("id").values_list("id", "stock")
+        )
+
+        stock = dict(previous)
+        for index, movement in movements:
+            product_id = movement["product_id"]
+            if product_id not in stock:
+                error = f"product {product_id} does not exist"
+            else:
+                if movement["kind"] == models.StockMovement.KIND_SET:
+                    delta = movement["value"] - stock[product_id]
+                else:
+                    delta = movement["value"]
+                error = None if stock[product_id] + delta >= 0 else f"stock of product {product_id} cannot go below 0"
+
+            if error:
+                if strict:
+                    raise StockError(f"movement {index}: {error}")
+                failed[index] = (product_id, error)
+                continue
+
+            stock[product_id] += delta
+            ledger.append((index, models.StockMovement(
+                product_id=product_id,
+                kind=movement["kind"],
+                delta=delta,
+                stock_after=stock[product_id],
+                note=movement.get("note", ""),
+                created_by=user,
+            )))
+
+        if failed or not write:
+            # a batch with invalid items is checked whole but nothing of it is written
+            return ledger, failed
+
+        _write_stock(previous, stock)
+        models.StockMovement.objects.bulk_create([movement for index, movement in ledger], batch_size=UPDATE_CHUNK_SIZE)
+
+    dashboard.invalidate()
+    caching.invalidate("products")
+    return ledger, failed
+
+
+def apply_movements(movements, user=None):
+    if len(movements) > MAX_MOVEMENTS:
+        raise StockError(f"at most {MAX_MOVEMENTS} movements per request")
+    ledger, failed = _apply(list(enumerate(movements)), user, strict=True)
+    return [movement for index, movement in ledger]
+
+
+def apply_bulk(items, user=None):
+    # scanner uploads: the batch is applied whole or not at all, and every invalid item is
+    # reported at once so the scanner can correct them in one go
+    if len(items) > MAX_BULK_ITEMS:
+        raise StockError(f"at most {MAX_BULK_ITEMS} items per request")
+
+    results = [None] * len(items)
+    movements = []
+    for index, item in enumerate(items):
+        try:
+            movements.append((index, parse_movement(item)))
+        except StockError as e:
+            results[index] = {"index": index, "ok": False, "error": str(e)}
+
+    ledger, failed = _apply(movements, user, strict=False, write=not any(results))
+    for index, (product_id, error) in failed.items():
+        results[index] = {"index": index, "ok": False, "product_id": product_id, "error": error}
+    applied = not any(results)
+    for index, movement in ledger:
+        results[index] = {
+            "index": index,
+            "ok": True,
+            "applied": applied,
+            "product_id": movement.product_id,
+            "delta": movement.delta,
+            "stock": movement.stock_after,
+        }
+    return results
@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+from . import media
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # files are named by the sha256 of their content, so uploading the same image twice stores it once.
+    # nothing is deleted on the request path, `manage.py collect_media_garbage` removes files no row points at
+
+    def _save(self, name, content):
+        if media.is_variant(name):
+            # resized variants are named after their original, which already carries the hash
+            return super()._save(name, content)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        target = os.path.join(directory, content_hash(content) + extension)
+        if self.exists(target):
+            # the collector keeps files younger than its grace period, a reused file counts as new again
+            for existing in [target, *media.variant_names(target)]:
+                if self.exists(existing):
+                    os.utime(self.path(existing))
+            return target
+        return super()._save(target, content)
@@ -0,0 +1,28 @@
+from django import template
+from django.utils.html import format_html
+
+from main import media
+
+register = template.Library()
+
+
+@register.filter
+def variant(field_file, name):
+    # {{ product.image|variant:"thumb" }} or {{ product.image|variant:"thumb.jpeg" }}
+    variant_name, _, fmt = name.partition(".")
+    return media.variant_url(field_file, variant_name, fmt or "webp")
+
+
+@register.simple_tag
+def picture(field_file, variant_name, alt="", css_class="", width=None):
+    # webp for browsers that take it, jpeg otherwise
+    webp = media.variant_url(field_file, variant_name, "webp")
+    jpeg = media.variant_url(field_file, variant_name, "jpeg")
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp"><img src="{}" alt="{}" class="{}" loading="lazy"{}></picture>',
+        webp,
+        jpeg,
+        alt,
+        css_class,
+        format_html(' width="{}"', width) if width else "",
+    )
@@ -1,3 +1,930 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import unittest
+import warnings
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import JsonResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import counters, dashboard, importers, media, models, notifications, pagination, queryplans, rollups, routers, search, stock
+
+
+class MediaTestMixin:
+    # uploads go to a temporary MEDIA_ROOT, never to the project's media folder
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class StockerTestCase(TestCase):
+
+    def setUp(self):
+        # the cache is not rolled back with the test transaction
+        cache.clear()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(self.user)
+        self.category = models.Category.objects.create(title="drinks")
+
+    def create_suppliers(self, count):
+        return [
+            models.Supplier.objects.create(name=f"supplier {i}", email="s@example.com", website="http://example.com", phone="0")
+            for i in range(count)
+        ]
+
+    def create_products(self, count, **fields):
+        return [
+            models.Product.objects.create(title=f"product {i}", description="d", Category=self.category, **fields)
+            for i in range(count)
+        ]
+
+    def count_queries(self, url):
+        # the cache is cleared so cached fragments, counts and permissions can't hide the queries
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, add_rows):
+        # the number of queries of a page must not grow with the number of rows it shows
+        add_rows(1)
+        few = self.count_queries(url)
+        add_rows(9)
+        self.assertEqual(self.count_queries(url), few, f"{url} runs more queries with more rows")
+
+
+class FragmentCacheTests(StockerTestCase):
+
+    def test_views_sharing_a_template_do_not_share_fragments(self):
+        self.create_suppliers(3)
+        product = self.create_products(1)[0]
+
+        response = self.client.get(reverse("main:suppliers_view"))
+        self.assertContains(response, "supplier 2")
+
+        response = self.client.get(reverse("main:product_suppliers_view", args=[product.id]))
+        self.assertNotContains(response, "supplier 2")
+
+
+class PaginationTests(StockerTestCase):
+
+    def walk(self, url, name):
+        # every page forward, then every page back from the last one
+        pages = []
+        query = ""
+        while query is not None:
+            page = self.client.get(url + "?" + query).context[name]
+            pages.append([obj.id for obj in page])
+            query = page.next_query
+        back = [pages[-1]]
+        query = page.previous_query
+        while query is not None:
+            page = self.client.get(url + "?" + query).context[name]
+            back.insert(0, [obj.id for obj in page])
+            query = page.previous_query
+        self.assertEqual(back, pages)
+        return [obj_id for page in pages for obj_id in page]
+
+    def test_cursor_pages_have_no_gaps_or_duplicates(self):
+        # rows sharing a timestamp are told apart by id
+        now = timezone.now()
+        self.create_products(25)
+        models.Product.objects.update(created_at=now)
+        self.create_suppliers(25)
+        models.Supplier.objects.filter(id__lte=models.Supplier.objects.order_by("id")[12].id).update(created_at=now)
+        for i in range(25):
+            User.objects.create_user(f"user{i}")
+        User.objects.update(date_joined=now)
+
+        cases = [
+            ("main:products_view", "products", models.Product.objects.order_by("created_at", "id")),
+            ("main:suppliers_view", "suppliers", models.Supplier.objects.order_by("created_at", "id")),
+            ("main:users_view", "users", User.objects.filter(is_superuser=False).order_by("date_joined", "id")),
+        ]
+        for url_name, name, expected in cases:
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                self.assertEqual(self.walk(reverse(url_name), name), list(expected.values_list("id", flat=True)))
+
+    def test_malformed_cursor_shows_the_first_page(self):
+        self.create_products(12)
+        first = [product.id for product in self.client.get(reverse("main:products_view")).context["products"]]
+        for cursor in ("garbage", "eyJ2IjogWzFdfQ==", pagination.encode_cursor(["x", 1, 2], "next")):
+            with self.subTest(cursor=cursor):
+                cache.clear()
+                response = self.client.get(reverse("main:products_view"), {"cursor": cursor})
+                self.assertEqual([product.id for product in response.context["products"]], first)
+
+    def test_counts_are_cached(self):
+        self.create_products(3, stock=1)
+        queryset = models.Product.objects.filter(stock=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(pagination.cached_count(queryset), 3)
+        self.create_products(1, stock=1)
+        with self.assertNumQueries(0):
+            self.assertEqual(pagination.cached_count(models.Product.objects.filter(stock=1)), 3)
+        self.assertEqual(pagination.cached_count(models.Product.objects.filter(stock=2)), 0)
+
+    def test_user_search_filters_by_name(self):
+        User.objects.create_user("alice", first_name="Alice")
+        User.objects.create_user("bob", first_name="Bob")
+        User.objects.create_superuser("root", first_name="Alice")
+        page = self.client.get(reverse("main:users_view"), {"searchuser": "Ali"}).context["users"]
+        self.assertEqual([user.username for user in page], ["alice"])
+
+    def test_users_page_without_view_permission(self):
+        staff = User.objects.create_user("staff", "staff@example.com", "password")
+        self.client.force_login(staff)
+        response = self.client.get(reverse("main:users_view"))
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductFilterTests(StockerTestCase):
+
+    def test_malformed_filters_are_ignored(self):
+        self.create_products(2)
+        for query in ("category=abc", "supplier=x", "expires_within=1.5", "min_price=NaN", "max_price=abc"):
+            with self.subTest(query=query):
+                response = self.client.get(reverse("main:products_view") + "?" + query)
+                self.assertContains(response, "product 1")
+                response = self.client.get(reverse("main:export_products") + "?" + query)
+                self.assertEqual(response.status_code, 200)
+
+
+class ExportTests(StockerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_products(2, price="1.00")
+        models.Product.objects.create(title="dear", description="d", price="9.00", Category=self.category)
+
+    def export(self, query):
+        response = self.client.get(reverse("main:export_products") + "?" + query)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_export_links_keep_the_listing_filters(self):
+        response = self.client.get(reverse("main:products_view") + "?min_price=5&cursor=abc")
+        url = reverse("main:export_products")
+        self.assertContains(response, f'href="{url}?min_price=5"')
+        self.assertContains(response, f'href="{url}?min_price=5&amp;format=gz"')
+
+    def test_filtered_export(self):
+        response, content = self.export("min_price=5")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(StringIO(content.decode())))
+        self.assertEqual([row[1] for row in rows[1:]], ["dear"])
+
+    def test_gzip_export(self):
+        response, content = self.export("min_price=5&format=gz")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(gzip.decompress(content), self.export("min_price=5")[1])
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "reads SQLite query plans")
+class QueryPlanTests(StockerTestCase):
+
+    def test_views_do_not_scan_whole_tables(self):
+        out = StringIO()
+        call_command("explain_queries", "--current-database", "--fail-on-scan", stdout=out)
+        self.assertIn(" 0 full table scans", out.getvalue())
+
+    def test_scans_outside_the_allowlist_fail(self):
+        self.assertEqual(queryplans.full_scans("SELECT id FROM main_product WHERE description = 'x'"), ["main_product"])
+        self.assertEqual(queryplans.full_scans("SELECT id FROM main_product WHERE stock < 5"), [])
+
+        with mock.patch.object(queryplans, "ALLOWED_SCANS", set()):
+            with self.assertRaisesMessage(CommandError, "full table scans found"):
+                call_command("explain_queries", "--current-database", "--fail-on-scan", stdout=StringIO())
+
+
+class DashboardTests(StockerTestCase):
+
+    def test_snapshot_query_count_does_not_grow_with_rows(self):
+        self.create_suppliers(2)
+        self.create_products(3)
+        with self.assertNumQueries(6):
+            dashboard.build_snapshot()
+
+        self.create_suppliers(10)
+        self.create_products(30, stock=5)
+        with self.assertNumQueries(6):
+            dashboard.build_snapshot()
+
+    def test_home_reads_the_cached_snapshot(self):
+        self.create_products(3)
+        self.client.get(reverse("main:home_view"))
+        # session and user, the snapshot, permissions and the dashboard fragment come from the cache
+        with self.assertNumQueries(2):
+            self.client.get(reverse("main:home_view"))
+
+    def test_writes_invalidate_the_snapshot(self):
+        self.client.get(reverse("main:home_view"))
+        self.create_products(1, stock=0)
+        data = dashboard.get_snapshot()["data"]
+        self.assertEqual(data["total_products"], 1)
+        self.assertEqual(data["total_products_out_of_stock"], 1)
+
+
+class CounterTests(StockerTestCase):
+
+    def assertInSync(self):
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+    def test_signals_keep_the_counters_in_sync(self):
+        low, high = self.create_products(2, stock=0)
+        self.assertInSync()
+
+        high.stock = settings.LOW_STOCK_THRESHOLD + 1
+        high.save()
+        low.stock = 1
+        low.save()
+        self.assertInSync()
+
+        supplier = self.create_suppliers(1)[0]
+        high.suppliers.add(supplier)
+        supplier.product_set.add(low)
+        high.suppliers.remove(supplier)
+        self.assertInSync()
+
+        supplier.delete()
+        low.delete()
+        self.assertInSync()
+
+        # the category takes its products with it
+        self.category.delete()
+        User.objects.create_user("staff")
+        self.assertInSync()
+        self.assertEqual(counters.get_all()[counters.PRODUCTS], 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.create_products(3, stock=0)
+        models.InventoryCounter.objects.filter(name=counters.OUT_OF_STOCK).update(value=F("value") + 5)
+
+        out = StringIO()
+        call_command("reconcile_counters", "--dry-run", stdout=out)
+        self.assertIn(f"{counters.OUT_OF_STOCK}: stored 8, actual 3 (drift +5)", out.getvalue())
+        self.assertEqual(counters.get_all()[counters.OUT_OF_STOCK], 8)
+
+        call_command("reconcile_counters", stdout=StringIO())
+        self.assertEqual(counters.get_all()[counters.OUT_OF_STOCK], 3)
+        self.assertInSync()
+
+
+class ListQueryTests(StockerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.supplier = self.create_suppliers(1)[0]
+
+    def add_products(self, count):
+        for product in self.create_products(count):
+            product.suppliers.add(self.supplier)
+
+    def test_product_list(self):
+        self.assertConstantQueries(reverse("main:products_view"), self.add_products)
+
+    def test_product_export(self):
+        self.assertConstantQueries(reverse("main:export_products"), self.add_products)
+
+    def test_supplier_products(self):
+        self.assertConstantQueries(reverse("main:supplier_products_view", args=[self.supplier.id]), self.add_products)
+
+    def test_supplier_list(self):
+        self.assertConstantQueries(reverse("main:suppliers_view"), self.create_suppliers)
+
+    def test_category_list(self):
+        def add_categories(count):
+            for i in range(count):
+                category = models.Category.objects.create(title=f"category {i}")
+                models.Product.objects.create(title="p", description="d", Category=category)
+        self.assertConstantQueries(reverse("main:categories_view"), add_categories)
+
+    def test_product_suppliers(self):
+        product = self.create_products(1)[0]
+        self.assertConstantQueries(
+            reverse("main:product_suppliers_view", args=[product.id]),
+            lambda count: product.suppliers.add(*self.create_suppliers(count)),
+        )
+
+
+class PermissionCacheTests(StockerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.group = Group.objects.create(name="staff")
+        self.group.permissions.set(Permission.objects.filter(
+            content_type__app_label="main", codename__in=["view_product", "add_product", "change_product", "delete_product"]
+        ))
+        self.staff = User.objects.create_user("staff", "staff@example.com", "password")
+        self.staff.groups.add(self.group)
+        self.client.force_login(self.staff)
+        self.create_products(3)
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in queries.captured_queries if '"auth_' in query["sql"]]
+
+    def test_cached_permissions_cost_at_most_one_query_per_page(self):
+        self.auth_queries(reverse("main:products_view"))
+        # only the user itself is loaded for the session, has_perm and {{ perms }} read the cached set
+        for url in (reverse("main:products_view"), reverse("main:home_view"), reverse("main:add_product")):
+            with self.subTest(url=url):
+                self.assertLessEqual(len(self.auth_queries(url)), 1)
+
+    def test_group_permission_changes_invalidate_the_cache(self):
+        self.assertEqual(self.client.get(reverse("main:products_view")).status_code, 200)
+        self.group.permissions.remove(Permission.objects.get(content_type__app_label="main", codename="view_product"))
+        self.assertRedirects(self.client.get(reverse("main:products_view")), reverse("main:home_view"), fetch_redirect_response=False)
+
+
+class ImportJobLeaseTests(MediaTestMixin, StockerTestCase):
+
+    def create_job(self, rows=3, **fields):
+        content = "id,title,description,price,stock,expire_date,category\n" + "".join(
+            f",imported {i},d,1.00,5,2030-01-01,drinks\n" for i in range(rows)
+        )
+        job = models.ImportJob(created_by=self.user, **fields)
+        job.file.save("products.csv", ContentFile(content.encode()), save=False)
+        job.save()
+        return job
+
+    def test_live_running_jobs_are_not_claimed_again(self):
+        job = self.create_job(status=models.ImportJob.STATUS_RUNNING, claimed_by="a", heartbeat_at=timezone.now())
+        self.assertEqual(importers.claim_jobs("b"), [])
+
+        models.ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=importers.LEASE_SECONDS + 1))
+        self.assertEqual(importers.claim_jobs("b"), [job.pk])
+        self.assertEqual(models.ImportJob.objects.get(pk=job.pk).claimed_by, "b")
+
+    def test_pending_jobs_are_claimed_once(self):
+        job = self.create_job()
+        self.assertEqual(importers.claim_jobs("a"), [job.pk])
+        self.assertEqual(importers.claim_jobs("b"), [])
+
+        job = importers.ImportJobRunner(models.ImportJob.objects.get(pk=job.pk), "a").run()
+        self.assertEqual(job.status, models.ImportJob.STATUS_DONE)
+        self.assertEqual(models.Product.objects.filter(title__startswith="imported").count(), 3)
+
+    def test_worker_that_lost_its_lease_stops_writing(self):
+        job = self.create_job(rows=5)
+        importers.claim_jobs("a")
+        runner = importers.ImportJobRunner(models.ImportJob.objects.get(pk=job.pk), "a", batch_size=2)
+        models.ImportJob.objects.filter(pk=job.pk).update(claimed_by="b")
+
+        job = runner.run()
+        self.assertEqual(job.claimed_by, "b")
+        self.assertEqual(job.status, models.ImportJob.STATUS_RUNNING)
+        self.assertFalse(models.Product.objects.filter(title__startswith="imported").exists())
+
+
+class ProductImporterTests(StockerTestCase):
+
+    def csv_lines(self, rows):
+        return ["id,title,description,price,stock,expire_date,category\n"] + [",".join(map(str, row)) + "\n" for row in rows]
+
+    def test_upsert_writes_only_changed_rows_and_fields(self):
+        unchanged, repriced = self.create_products(2, price="1.00", stock=5)
+        # expire_date is auto_now_add, it only takes a chosen date through update()
+        models.Product.objects.update(expire_date="2030-01-01")
+        lines = self.csv_lines([
+            (unchanged.id, "product 0", "d", "1.00", 5, "2030-01-01", "drinks"),
+            (repriced.id, "product 1", "d", "2.50", 5, "2030-01-01", "drinks"),
+            ("", "new", "d", "3.00", 1, "2030-01-01", "drinks"),
+        ])
+
+        importer = importers.ProductImporter(mode=models.ImportJob.MODE_UPSERT)
+        with CaptureQueriesContext(connection) as queries:
+            importer.run(lines)
+        self.assertEqual((importer.created, importer.updated, importer.errors), (1, 1, []))
+
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith('UPDATE "main_product"')]
+        self.assertEqual(len(updates), 1)
+        # one column, one row
+        self.assertRegex(updates[0], r'^UPDATE "main_product" SET "price" = [^,]* WHERE "main_product"\."id" IN \(%d\)$' % repriced.id)
+
+        repriced.refresh_from_db()
+        self.assertEqual(str(repriced.price), "2.50")
+        self.assertEqual(list(models.StockMovement.objects.values_list("product__title", flat=True)), ["new"])
+
+    def test_bad_row_is_reported_and_the_rest_imported(self):
+        rows = [("", f"imported {i}", "d", "1.00", 5, "2030-01-01", "drinks") for i in range(4)]
+        rows.insert(2, ("", "broken", "d", "abc", 5, "2030-01-01", "drinks"))
+
+        importer = importers.ProductImporter().run(self.csv_lines(rows))
+        self.assertEqual(importer.created, 4)
+        # the header is line 1, the bad row is the third data row
+        self.assertEqual(importer.errors, [(4, "invalid price 'abc'")])
+        self.assertEqual(models.Product.objects.filter(title__startswith="imported").count(), 4)
+        self.assertFalse(models.Product.objects.filter(title="broken").exists())
+
+    def test_query_count_follows_batches_not_rows(self):
+        def count(rows, batch_size):
+            lines = self.csv_lines(("", f"imported {i}", "d", "1.00", i, "2030-01-01", "drinks") for i in range(rows))
+            with CaptureQueriesContext(connection) as queries:
+                importers.ProductImporter(batch_size=batch_size).run(lines)
+            return len(queries)
+
+        # two batches each time, of 5 and of 50 rows
+        self.assertEqual(count(10, 5), count(100, 50))
+
+
+class MediaGarbageTests(MediaTestMixin, TestCase):
+
+    def image(self, color):
+        buffer = BytesIO()
+        Image.new("RGB", (300, 300), color).save(buffer, "PNG")
+        return ContentFile(buffer.getvalue())
+
+    def age(self, names, hours=2):
+        old = time.time() - hours * 3600
+        for name in names:
+            os.utime(default_storage.path(name), (old, old))
+
+    def test_deduplicated_upload_survives_collection(self):
+        reused = default_storage.save("images/apple.png", self.image("red"))
+        orphan = default_storage.save("images/pear.png", self.image("green"))
+        files = [reused, *media.generate(default_storage, reused), orphan]
+        self.age(files)
+
+        # the same image uploaded again for a row that is not committed yet
+        self.assertEqual(default_storage.save("images/apple-again.png", self.image("red")), reused)
+        call_command("collect_media_garbage", stdout=StringIO())
+
+        for name in files[:-1]:
+            self.assertTrue(default_storage.exists(name), name)
+        self.assertFalse(default_storage.exists(orphan))
+
+
+    def test_variant_urls_do_not_touch_the_storage(self):
+        cache.clear()
+        product = models.Product(image=default_storage.save("images/apple.png", self.image("red")))
+        self.assertEqual(media.variant_url(product.image, "thumb"), product.image.url)
+
+        media.generate_variants(product.image)
+        with mock.patch.object(type(default_storage._wrapped), "exists") as exists:
+            for _ in range(3):
+                self.assertEqual(media.variant_url(product.image, "thumb", "jpeg"), default_storage.url(media.variant_name(product.image.name, "thumb", "jpeg")))
+        exists.assert_not_called()
+
+        self.age([product.image.name, *media.variant_names(product.image.name)])
+        call_command("collect_media_garbage", stdout=StringIO())
+        self.assertEqual(media.variant_url(product.image, "thumb"), product.image.url)
+
+
+@override_settings(ALERT_RECIPIENTS=["manager@example.com"])
+class NotificationTests(StockerTestCase):
+
+    def test_claimed_alerts_are_sent_by_one_sender(self):
+        products = self.create_products(3)
+        notifications.enqueue_low_stock_alerts([product.id for product in products])
+
+        claimed = notifications.claim_pending()
+        self.assertEqual(len(claimed), 3)
+        # a digest running next to the sender that claimed the rows finds nothing to send
+        self.assertEqual(notifications.send_alert_digest(), (0, 0))
+        self.assertEqual(notifications.send_pending_notifications(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+        # the rows of a sender that died are taken over once the claim expired
+        models.Notification.objects.update(claimed_at=timezone.now() - timedelta(seconds=notifications.CLAIM_SECONDS + 1))
+        self.assertEqual(notifications.send_alert_digest(), (1, 3))
+        self.assertEqual(models.Notification.objects.filter(status=models.Notification.STATUS_SENT).count(), 3)
+
+    def test_failed_sends_go_back_to_the_outbox(self):
+        notifications.enqueue_low_stock_alerts([self.create_products(1)[0].id])
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=OSError("connection refused")):
+            self.assertEqual(notifications.send_pending_notifications(), (0, 1))
+
+        notification = models.Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), (models.Notification.STATUS_PENDING, 1))
+        self.assertEqual(notifications.send_pending_notifications(), (1, 0))
+
+    def test_expiry_gate_is_released_when_enqueuing_fails(self):
+        models.Product.objects.create(title="milk", description="d", Category=self.category, expire_date=timezone.now().date())
+        with mock.patch.object(notifications, "_enqueue", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                notifications.enqueue_expiry_alerts()
+
+        self.assertEqual(notifications.enqueue_expiry_alerts(), 1)
+        self.assertEqual(notifications.enqueue_expiry_alerts(), 0)
+
+
+class StockMovementTests(StockerTestCase):
+
+    def post_movements(self, *movements):
+        return self.client.post(reverse("main:stock_movements"), json.dumps({"movements": list(movements)}), content_type="application/json")
+
+    def test_only_whole_numbers_are_accepted(self):
+        product = self.create_products(1, stock=10)[0]
+        for value in (True, 1.9, "5", None):
+            with self.subTest(value=value):
+                self.assertEqual(self.post_movements({"product_id": product.id, "delta": value}).status_code, 400)
+
+        self.assertEqual(self.post_movements({"product_id": product.id, "delta": -3}).status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 7)
+
+    @override_settings(LOW_STOCK_THRESHOLD=10)
+    def test_alerts_and_counts_agree_on_low_stock(self):
+        at_threshold, below = self.create_products(2, stock=50)
+        self.post_movements({"product_id": at_threshold.id, "stock": 10}, {"product_id": below.id, "stock": 9})
+
+        alerted = models.Notification.objects.filter(kind=models.Notification.KIND_LOW_STOCK).values_list("product_id", flat=True)
+        self.assertEqual(list(alerted), [below.id])
+        self.assertEqual(counters.get_all()[counters.LOW_STOCK], 1)
+        self.assertEqual(dashboard.get_snapshot()["data"]["total_products_low_stock"], 1)
+        filtered = self.client.get(reverse("main:products_view"), {"stock": "low"}).context["products"]
+        self.assertEqual([product.id for product in filtered], [below.id])
+
+    def test_stock_form_sets_the_stock(self):
+        product = self.create_products(1, stock=10)[0]
+        self.client.post(reverse("main:update_product_stock", args=[product.id]), {"stock": "abc"})
+        self.client.post(reverse("main:update_product_stock", args=[product.id]), {"stock": "4"})
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 4)
+
+
+class BulkStockTests(StockerTestCase):
+
+    def post_items(self, items):
+        return self.client.post(reverse("main:bulk_update_stock"), json.dumps({"items": items}), content_type="application/json")
+
+    def test_every_item_gets_a_result(self):
+        first, second = self.create_products(2, stock=10)
+        response = self.post_items([{"product_id": first.id, "stock": 3}, {"product_id": second.id, "delta": 5}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"applied": 2, "failed": 0, "results": [
+            {"index": 0, "ok": True, "applied": True, "product_id": first.id, "delta": -7, "stock": 3},
+            {"index": 1, "ok": True, "applied": True, "product_id": second.id, "delta": 5, "stock": 15},
+        ]})
+        self.assertEqual(dict(models.Product.objects.values_list("id", "stock")), {first.id: 3, second.id: 15})
+        self.assertEqual(models.StockMovement.objects.count(), 2)
+
+    def test_invalid_items_reject_the_whole_batch(self):
+        product = self.create_products(1, stock=10)[0]
+        response = self.post_items([
+            {"product_id": product.id, "delta": -4},
+            {"product_id": product.id, "delta": "x"},
+            {"product_id": 0, "stock": 1},
+            {"product_id": product.id, "delta": -20},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual((data["applied"], data["failed"]), (0, 3))
+        self.assertEqual([result["ok"] for result in data["results"]], [True, False, False, False])
+        self.assertFalse(data["results"][0]["applied"])
+        self.assertEqual(data["results"][2]["error"], "product 0 does not exist")
+        self.assertEqual(data["results"][3]["error"], f"stock of product {product.id} cannot go below 0")
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 10)
+        self.assertFalse(models.StockMovement.objects.exists())
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        products = self.create_products(40, stock=10)
+
+        def count(items):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post_items(items).status_code, 200)
+            return len(queries)
+
+        few = count([{"product_id": product.id, "delta": -1} for product in products[:2]])
+        self.assertEqual(count([{"product_id": product.id, "delta": -1} for product in products]), few)
+
+
+@mock.patch.object(rollups, "SETTLE_SECONDS", 0)
+class RollupTests(StockerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localtime().date()
+        self.products = self.create_products(2, stock=100)
+        self.other = models.Product.objects.create(title="other", description="d", stock=100, Category=models.Category.objects.create(title="food"))
+
+    def move(self, product, delta, days_ago=0):
+        movement = stock.apply_movements([{"product_id": product.id, "kind": models.StockMovement.KIND_DELTA, "value": delta}])[0]
+        # a timestamp at noon keeps the movement on its day in any time zone offset
+        created_at = timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), datetime.min.time().replace(hour=12)))
+        models.StockMovement.objects.filter(pk=movement.pk).update(created_at=created_at)
+        return movement
+
+    def ledger(self, since, **scope):
+        # the raw movements summed per day, what the rollups have to agree with
+        days = {}
+        for delta, created_at in models.StockMovement.objects.filter(**scope).values_list("delta", "created_at"):
+            day = timezone.localtime(created_at).date()
+            if day < since:
+                continue
+            row = days.setdefault(day, {"period_start": day, "movements": 0, "stock_in": 0, "stock_out": 0})
+            row["movements"] += 1
+            row["stock_in"] += max(delta, 0)
+            row["stock_out"] += max(-delta, 0)
+        return [days[day] for day in sorted(days)]
+
+    def test_rollups_match_the_ledger(self):
+        for days_ago, delta in ((0, 5), (0, -3), (1, -7), (3, 2), (9, -1)):
+            self.move(self.products[0], delta, days_ago)
+            self.move(self.products[1], -delta, days_ago + 1)
+        self.move(self.other, 4, 2)
+
+        self.assertEqual(rollups.build(chunk_size=3), 11)
+        self.assertEqual(rollups.build(), 0)
+
+        since = self.today - timedelta(days=30)
+        for product in self.products:
+            self.assertEqual(rollups.history(since, product_id=product.id), self.ledger(since, product=product))
+        self.assertEqual(
+            rollups.history(since, category_id=self.category.id), self.ledger(since, product__Category=self.category)
+        )
+
+        weeks = rollups.history(since, models.StockRollup.PERIOD_WEEK, category_id=self.category.id)
+        self.assertEqual(sum(row["movements"] for row in weeks), 10)
+        self.assertTrue(all(row["period_start"].weekday() == 0 for row in weeks))
+
+        trend = rollups.trend(days=14)
+        self.assertEqual(len(trend), 14)
+        self.assertEqual(sum(row["movements"] for row in trend), 11)
+        self.assertEqual(trend[-1], {"period_start": self.today, "movements": 2, "stock_in": 5, "stock_out": 3})
+
+    def test_history_adds_the_unbuilt_tail_to_the_rollups(self):
+        product = self.products[0]
+        self.move(product, 5, 1)
+        self.move(product, -2)
+        rollups.build()
+        # the built movements are only read through their rollups from now on
+        models.StockMovement.objects.all().delete()
+        self.move(product, -1)
+        self.move(self.products[1], 9)
+
+        since = self.today - timedelta(days=7)
+        with self.assertNumQueries(3):
+            history = rollups.history(since, product_id=product.id)
+        self.assertEqual(history, [
+            {"period_start": self.today - timedelta(days=1), "movements": 1, "stock_in": 5, "stock_out": 0},
+            {"period_start": self.today, "movements": 2, "stock_in": 0, "stock_out": 3},
+        ])
+
+    def test_history_view_query_count_is_fixed(self):
+        product = self.products[0]
+
+        def add_movements(count):
+            for days_ago in range(count):
+                self.move(product, 1, days_ago)
+            rollups.build()
+            self.move(product, -1)
+
+        url = reverse("main:stock_history", args=[product.id])
+        self.assertConstantQueries(url, add_movements)
+        self.assertEqual(sum(row["net_change"] for row in self.client.get(url).json()["history"]), 8)
+
+
+class ChoiceTests(StockerTestCase):
+
+    def test_product_form_works_without_javascript(self):
+        supplier = self.create_suppliers(1)[0]
+        response = self.client.get(reverse("main:add_product"))
+        self.assertContains(response, f'<option value="{self.category.id}">drinks</option>', html=True)
+        self.assertContains(response, f'<option value="{supplier.id}">supplier 0</option>', html=True)
+
+        self.client.post(reverse("main:add_product"), {
+            "title": "tea", "description": "d", "price": "2.50", "expire_date": "2030-01-01",
+            "category": self.category.id, "suppliers": [supplier.id],
+        })
+        product = models.Product.objects.get(title="tea")
+        self.assertEqual(list(product.suppliers.all()), [supplier])
+
+        response = self.client.get(reverse("main:edit_product", args=[product.id]))
+        self.assertContains(response, f'<option value="{self.category.id}" selected>drinks</option>', html=True)
+
+    def test_typeahead_is_allowed_to_product_editors(self):
+        editor = User.objects.create_user("editor", is_staff=True)
+        self.client.force_login(editor)
+        url = reverse("main:choice_options", args=["categories"])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        editor.user_permissions.add(Permission.objects.get(content_type__app_label="main", codename="change_product"))
+        cache.clear()
+        response = self.client.get(url, {"q": "dri"})
+        self.assertEqual(response.json()["results"], [{"id": self.category.id, "label": "drinks"}])
+
+
+class SearchTests(StockerTestCase):
+
+    def test_search_pages_follow_the_ranking(self):
+        products = [
+            models.Product.objects.create(title=("apple " * (i % 3 + 1)) + str(i), description="d", Category=self.category)
+            for i in range(25)
+        ]
+        models.Product.objects.create(title="pear", description="d", Category=self.category)
+
+        seen = []
+        query = "search=apple"
+        while query:
+            page = self.client.get(reverse("main:products_view") + "?" + query).context["products"]
+            self.assertEqual(page.total_count, 25)
+            seen += [product.id for product in page]
+            query = page.next_query
+        self.assertEqual(sorted(seen), [product.id for product in products])
+
+        ranked = list(search.search_products(models.Product.objects.all(), "apple"))
+        self.assertEqual(seen, [product.id for product in ranked])
+        self.assertEqual(ranked, sorted(ranked, key=lambda product: (product.search_rank, product.id)))
+
+    def test_short_terms_use_the_plain_lookup(self):
+        pineapple = models.Product.objects.create(title="pineapple", description="d", Category=self.category)
+        apple = models.Product.objects.create(title="apple", description="d", Category=self.category)
+
+        short = search.search_products(models.Product.objects.all(), "app")
+        self.assertNotIn("search_rank", short.query.annotations)
+        self.assertEqual(list(short), [pineapple, apple])
+
+        # full text matches word prefixes only
+        ranked = search.search_products(models.Product.objects.all(), "apple")
+        self.assertIn("search_rank", ranked.query.annotations)
+        self.assertEqual(list(ranked), [apple])
+
+
+class RecordingReplicaRouter(routers.ReplicaRouter):
+    reads = []
+    writes = []
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        self.reads.append((model._meta.app_label, alias or "default"))
+        return alias
+
+    def db_for_write(self, model, **hints):
+        alias = super().db_for_write(model, **hints)
+        self.writes.append((model._meta.app_label, alias))
+        return alias
+
+
+class ReplicaRoutingTests(StockerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # the replica mirrors the test database through the same connection, the router decides which alias is asked
+        settings_override = override_settings(
+            DATABASES={**settings.DATABASES, routers.REPLICA: {**settings.DATABASES["default"], "TEST": {"MIRROR": "default"}}},
+            DATABASE_ROUTERS=["main.tests.RecordingReplicaRouter"],
+        )
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", "Overriding setting DATABASES")
+            settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        connections[routers.REPLICA] = connections["default"]
+        self.addCleanup(connections.__delitem__, routers.REPLICA)
+        self.product = self.create_products(1, stock=10)[0]
+        RecordingReplicaRouter.reads.clear()
+        RecordingReplicaRouter.writes.clear()
+
+    def reads(self, url):
+        cache.clear()
+        RecordingReplicaRouter.reads.clear()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        return {alias for app_label, alias in RecordingReplicaRouter.reads if app_label == "main"}
+
+    def test_read_only_views_read_from_the_replica(self):
+        for name in ("main:products_view", "main:categories_view", "main:suppliers_view"):
+            with self.subTest(name=name):
+                self.assertEqual(self.reads(reverse(name)), {routers.REPLICA})
+        # users and sessions always come from the primary
+        self.assertNotIn(("auth", routers.REPLICA), RecordingReplicaRouter.reads)
+        self.assertEqual(self.reads(reverse("main:edit_product", args=[self.product.id])), {"default"})
+
+    def test_writes_go_to_the_primary(self):
+        self.client.post(reverse("main:update_product_stock", args=[self.product.id]), {"stock": "4"})
+        self.assertTrue(RecordingReplicaRouter.writes)
+        self.assertEqual({alias for app_label, alias in RecordingReplicaRouter.writes}, {"default"})
+        self.product.refresh_from_db(using="default")
+        self.assertEqual(self.product.stock, 4)
+
+    def test_session_reads_the_primary_after_a_write(self):
+        self.client.post(reverse("main:update_product_stock", args=[self.product.id]), {"stock": "4"})
+        self.assertEqual(self.reads(reverse("main:products_view")), {"default"})
+
+        later = time.time() + settings.REPLICA_PIN_SECONDS + 1
+        with mock.patch("main.routers.time.time", return_value=later):
+            self.assertEqual(self.reads(reverse("main:products_view")), {routers.REPLICA})
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "SQLite pragmas")
+class SQLitePragmaTests(TestCase):
+
+    @override_settings(SQLITE_PRAGMAS={"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 1234})
+    def test_pragmas_are_applied_to_new_connections(self):
+        # WAL needs a database file, the in-memory test database stays in memory journaling
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        new_connection = connections["default"].__class__({**connection.settings_dict, "NAME": os.path.join(directory, "db.sqlite3")}, "pragmas")
+        self.addCleanup(new_connection.close)
+
+        with new_connection.cursor() as cursor:
+            values = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute(f"PRAGMA {name}")
+                values[name] = cursor.fetchone()[0]
+        # synchronous reads back as a number, NORMAL is 1
+        self.assertEqual(values, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 1234})
+
+
+def supplier_counts_view(request):
+    # one count per supplier, the N+1 the profiler has to flag
+    return JsonResponse({supplier.name: supplier.product_set.count() for supplier in models.Supplier.objects.order_by("id")})
+
+
+# only served by ProfilingTests, see ROOT_URLCONF there
+urlpatterns = [
+    path("supplier-counts", supplier_counts_view, name="supplier_counts"),
+]
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MEMORY=False, PROFILING_REPEAT_THRESHOLD=3)
+class ProfilingTests(StockerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(MIDDLEWARE=["main.profiling.ProfilingMiddleware", *settings.MIDDLEWARE])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def profile(self, url):
+        with self.assertLogs("stocker.profiling", "INFO") as logs:
+            response = self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage())
+
+    def test_server_timing_header(self):
+        response, record = self.profile(reverse("main:products_view"))
+        self.assertEqual(record["view"], "main:products_view")
+        self.assertGreater(record["sql_count"], 0)
+        self.assertEqual(re.findall(r"(?:^|, )(\w+);", response["Server-Timing"]), ["total", "sql", "template"])
+        self.assertIn(f'desc="{record["sql_count"]} queries, {record["duplicate_queries"]} duplicates"', response["Server-Timing"])
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_repeated_queries_are_logged(self):
+        self.create_suppliers(4)
+        response, record = self.profile("/supplier-counts")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["view"], "supplier_counts")
+        self.assertEqual(len(record["repeated_queries"]), 1)
+        self.assertEqual(record["repeated_queries"][0]["count"], 4)
+        self.assertIn("main_product_suppliers", record["repeated_queries"][0]["sql"])
+
+    def test_report_aggregates_per_endpoint(self):
+        records = [
+            {"ts": "2026-01-01T00:00:00", "method": "GET", "path": "/products/", "view": "main:products_view", "status": 200,
+             "total_ms": total, "sql_count": 4, "sql_ms": 2.0, "duplicate_queries": duplicates, "template_ms": 1.0,
+             "repeated_queries": [{"sql": "SELECT COUNT(*) FROM main_product_suppliers", "count": 6}] if duplicates else []}
+            for total, duplicates in ((10, 0), (20, 2), (30, 0))
+        ]
+        records.append({**records[0], "ts": "2025-01-01T00:00:00", "view": "main:home_view", "total_ms": 500})
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as log:
+            log.write("\n".join(json.dumps(record) for record in records) + "\nnot json\n")
+        self.addCleanup(os.remove, log.name)
+
+        out = StringIO()
+        call_command("profiling_report", "--log", log.name, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "4 requests, 2 endpoints, sorted by p95")
+        self.assertTrue(lines[2].startswith("GET main:home_view"))
+        self.assertEqual(lines[3].split()[2:7], ["3", "20.0", "30.0", "30.0", "4.0"])
+        self.assertIn("up to 6x  SELECT COUNT(*) FROM main_product_suppliers", out.getvalue())
+
+        out = StringIO()
+        call_command("profiling_report", "--log", log.name, "--since", "2026-01-01", stdout=out)
+        self.assertTrue(out.getvalue().startswith("3 requests, 1 endpoints"))
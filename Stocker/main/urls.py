@@ -13,9 +13,14 @@ urlpatterns = [
     path('products/<id>/edit', views.edit_product, name="edit_product"),
     path('products/<id>/update_product_stock', views.update_product_stock, name="update_product_stock"),
     path('products/<id>/delete', views.delete_product, name="delete_product"),
+    path('products/<id>/stock/history', views.stock_history, name="stock_history"),
     path('products/<id>/suppliers', views.product_suppliers_view, name="product_suppliers_view"),
+    path('products/stock/movements', views.stock_movements, name="stock_movements"),
+    path('products/stock/bulk', views.bulk_update_stock, name="bulk_update_stock"),
     path('products/export', views.export_products, name="export_products"),
     path('products/import', views.import_csv, name="import_csv"),
+    path('products/import/<id>', views.import_job_view, name="import_job_view"),
+    path('products/import/<id>/status', views.import_job_status, name="import_job_status"),
     path('categories/', views.categories_view, name="categories_view"),
     path('categories/add', views.add_category, name="add_category"),
     path('categories/<id>/edit', views.edit_category, name="edit_category"),
@@ -25,6 +30,8 @@ urlpatterns = [
     path('suppliers/<id>/edit', views.edit_supplier, name="edit_supplier"),
     path('suppliers/<id>/delete', views.delete_supplier, name="delete_supplier"),
     path('suppliers/<id>/products', views.supplier_products_view , name="supplier_products_view"),
+    path('choices/<kind>', views.choice_options, name="choice_options"),
+    path('cache/stats', views.cache_stats, name="cache_stats"),
     path('users/', views.users_view, name="users_view"),
     path('users/add', views.add_user, name="add_user"),
     path('users/<id>/edit', views.edit_user, name="edit_user"),
@@ -1,20 +1,34 @@
 from django.conf import settings
 from django.shortcuts import render,redirect
 from django.http import HttpRequest
-from . import forms,models
+from . import caching,choices,counters,dashboard,exports,forms,media,models,notifications,pagination,rollups,search,stock
 from django.contrib.auth import authenticate,login,logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q,Count, Avg
-from django.core.mail import EmailMessage
+from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
 from django.utils.timezone import localtime
+from datetime import timedelta
 import os
-from django.contrib.auth.models import Group
-from django.utils import timezone
-from datetime import datetime, timedelta
-import csv
-from django.http import HttpResponse
+from django.http import JsonResponse,StreamingHttpResponse
+from django.views.decorators.http import require_POST
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_SORTS = {
+    "price": ('price', 'id'),
+    "-price": ('-price', '-id'),
+}
+
+
+def set_days_to_expire(page_obj):
+    # only the rows of the current page are loaded and annotated
+    page_obj.object_list = list(page_obj.object_list)
+    today = localtime().date()
+    for product in page_obj.object_list:
+        product.days_to_expire = (product.expire_date - today).days
 
 
 def login_view(request:HttpRequest):
@@ -28,44 +42,11 @@ def login_view(request:HttpRequest):
  
                 user = authenticate(request, username=username, password=password)
                 if user:
-                    #Check products that reach expire date soon
-                    managers = User.objects.filter(is_superuser=True).all()
-
-                    products_expiring_soon = models.Product.objects.filter(
-                        expire_date__lte=timezone.now().date() + timedelta(days=10),
-                        expire_date__gte=timezone.now().date()
-                    )
-
-                    for product in products_expiring_soon:
-                        days_until_expiry = (product.expire_date - timezone.now().date()).days
-                        try:
-                            content = f"""
-                            <html>
-                            <body>
-                                <div style="font-family: Arial, sans-serif; padding: 20px; border: 1px solid #ddd; border-radius: 5px;">
-                                    <h2 style="color: #d9534f;">⚠️ Product Expiry Alert</h2>
-                                    <div style="background-color: #f9f9f9; padding: 15px; margin: 15px 0; border-left: 4px solid #d9534f;">
-                                        <p><strong>Product:</strong> {product.title}</p>
-                                        <p><strong>Expiry Date:</strong> {product.expire_date.strftime('%Y-%m-%d')}</p>
-                                        <p><strong>Days Remaining:</strong> {days_until_expiry} days</p>
-                                        <p><strong>Status:</strong> {"Expired" if days_until_expiry <= 0 else "Expiring soon"}</p>
-                                    </div>
-                                </div>
-                            </body>
-                            </html>
-                            """
-                            for manager in managers:
-                                if manager.email:
-                                    email = EmailMessage(
-                                        "Product Expiry Alert",
-                                        content,
-                                        settings.DEFAULT_FROM_EMAIL,
-                                        [manager.email],
-                                    )
-                                    email.content_subtype = "html"
-                                    email.send()
-                        except Exception as e:
-                            print(e)
+                    #Queue alerts for products that reach expire date soon, the send_notifications worker delivers them
+                    try:
+                        notifications.enqueue_expiry_alerts()
+                    except Exception:
+                        logger.exception("could not queue expiry alerts")
                     login(request, user)
                     return redirect("main:home_view")
                 else: 
@@ -83,34 +64,13 @@ def home_view(request:HttpRequest):
         messages.warning(request,"sorry ! you must be logged in to access page", "bg-orange-300")
         return redirect('main:login_view')
 
-    avg_products_per_supplier = models.Supplier.objects.annotate(
-        product_count=Count('product')
-        ).aggregate(
-            Avg('product_count')
-            )['product_count__avg']
-    last_30_days = timezone.localtime() - timedelta(days=30)
-    new_suppliers_count = models.Supplier.objects.filter(created_at__gte=last_30_days).count()
-
-    data = {
-        "total_products": models.Product.objects.count(),
-        "total_products_in_stock": models.Product.objects.filter(Q(stock__gt=100)).count(),
-        "total_products_low_stock": models.Product.objects.filter(Q(stock__lt=100)).count(),
-        "total_products_out_of_stock": models.Product.objects.filter(Q(stock=0)).count(),
-        "products_average_prices": models.Product.objects.aggregate(Avg('price'))['price__avg'],
-        "average_product_for_supplier":avg_products_per_supplier,
-        "new_suppliers_count":new_suppliers_count,
-        "suppliers_with_products": models.Supplier.objects.annotate(products_count=Count('product')).filter(products_count__gt=0).count(),
-        "suppliers_without_products": models.Supplier.objects.annotate(products_count=Count('product')).filter(products_count=0).count(),
-        "total_categories":models.Category.objects.count(),
-        "total_suppliers":models.Supplier.objects.count(),
-        "total_users":User.objects.filter(is_superuser=False).count()
-    }
-    products = models.Product.objects.order_by('stock')[:5]
-    highest_suppliers = models.Supplier.objects.annotate(products_count = Count('product', distinct=False)).order_by('-products_count')[:5]
+    # only loaded when the cached dashboard fragment misses
+    snapshot = SimpleLazyObject(dashboard.get_snapshot)
     return render(request, "home.html", {
-        "data":data,
-        "products":products,
-        "highest_suppliers":highest_suppliers
+        "data":SimpleLazyObject(lambda: snapshot["data"]),
+        "products":SimpleLazyObject(lambda: snapshot["products"]),
+        "highest_suppliers":SimpleLazyObject(lambda: snapshot["highest_suppliers"]),
+        "stock_trend":SimpleLazyObject(lambda: snapshot["stock_trend"]),
 
     })
 
@@ -124,23 +84,26 @@ def products_view(request:HttpRequest):
         messages.warning(request,"sorry ! you cannot access to previous page", "bg-orange-300")
         return redirect('main:home_view')    
 
-    if "search" in request.GET:
-        products = models.Product.objects.filter(title__contains=request.GET["search"])
-    else:
-        products = models.Product.objects.all()
+    def get_page():
+        products = exports.filter_products(models.Product.objects.with_list_data(), request.GET)
+        if "search" in request.GET:
+            products = search.search_products(products, request.GET["search"])
 
-    today = localtime().date()
+        total = None
+        if "search" not in request.GET and not any(request.GET.get(name) for name in exports.FILTERS):
+            total = counters.get_all()[counters.PRODUCTS]
 
-    for product in products:
-        product.days_to_expire = (product.expire_date - today).days
-        
-        
-    paginator = Paginator(products, 10) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        ordering = PRODUCT_SORTS.get(request.GET.get("sort")) or search.ordering(products, ('created_at', 'id'))
+        paginator = pagination.CursorPaginator(products, ordering, 10, total)
+        page_obj = paginator.get_page(request)
+        set_days_to_expire(page_obj)
+        return page_obj
 
+    # the page is only built when the cached list fragment misses
     return render(request, "products/home.html",{
-        "products": page_obj
+        "products": SimpleLazyObject(get_page),
+        "export_query": exports.export_query(request.GET),
+        "export_gz_query": exports.export_query(request.GET, format="gz"),
     })
 
 
@@ -161,21 +124,21 @@ def add_product(request:HttpRequest):
 
         if form.is_valid():
             image = request.FILES.get('image', models.Product._meta.get_field('image').default)
-            category = models.Category.objects.get(id=request.POST['category'])
+            category = form.cleaned_data['category']
             new_product = models.Product(
                 title=request.POST['title'],
                 description=request.POST['description'],
                 image=image,
-                price=request.POST['price'],
+                price=form.cleaned_data['price'],
                 expire_date=request.POST['expire_date'],
                 Category=category,
             )
             new_product.save()
-            new_product.suppliers.set(request.POST.getlist('suppliers')) 
+            if request.FILES.get('image'):
+                media.generate_variants(new_product.image)
+            new_product.suppliers.set(form.cleaned_data['suppliers'])
             messages.success(request,"Product added sucessfully !", 'bg-green-500')
             return redirect("main:products_view")
-        else:
-            print("error")
      
             
         
@@ -184,12 +147,14 @@ def add_product(request:HttpRequest):
         form = forms.SupplierForm()
 
 
-    categories = models.Category.objects.all()
-    suppliers = models.Supplier.objects.all()
+    # the submitted choices and a bounded, cached option list are rendered, the typeahead searches the rest
+    category_ids, supplier_ids = request.POST.getlist('category'), request.POST.getlist('suppliers')
     return render(request, "products/add_product.html", {
         "form": form,
-        "categories": categories,
-        "suppliers": suppliers
+        "selected_categories": choices.selected("categories", category_ids),
+        "selected_suppliers": choices.selected("suppliers", supplier_ids),
+        "category_options": choices.options("categories", category_ids),
+        "supplier_options": choices.options("suppliers", supplier_ids),
     })
 
 def edit_product(request:HttpRequest, id:int):
@@ -209,21 +174,20 @@ def edit_product(request:HttpRequest, id:int):
     
     if request.method == "POST":
         form = forms.ProductForm(request.POST)
-        category = models.Category.objects.get(id=request.POST['category'])
         if form.is_valid():
             product.title = request.POST['title']
             product.description=request.POST['description']
-            product.price=request.POST['price']
+            product.price=form.cleaned_data['price']
             product.expire_date=request.POST['expire_date']
-            product.Category=category
+            product.Category=form.cleaned_data['category']
             if request.FILES.get('image'):
-                image_path = os.path.join(settings.MEDIA_ROOT, product.image.name)
-                if os.path.isfile(image_path):
-                    os.remove(image_path)
+                # the old file may be shared, unreferenced files are swept by collect_media_garbage
                 product.image = request.FILES['image']
                         
 
             product.save()
+            if request.FILES.get('image'):
+                media.generate_variants(product.image)
             messages.success(request,"Product updated sucessfully !", 'bg-green-500')
             return redirect("main:products_view")
      
@@ -234,13 +198,17 @@ def edit_product(request:HttpRequest, id:int):
         form = forms.ProductForm()
 
 
-    categories = models.Category.objects.all()
-    suppliers = models.Supplier.objects.all()
+    if request.method == "POST":
+        category_ids, supplier_ids = request.POST.getlist('category'), request.POST.getlist('suppliers')
+    else:
+        category_ids, supplier_ids = [product.Category_id], list(product.suppliers.values_list('id', flat=True))
     return render(request, "products/edit_product.html", {
         "form": form,
         "product":product,
-        "categories": categories,
-        "suppliers": suppliers
+        "selected_categories": choices.selected("categories", category_ids),
+        "selected_suppliers": choices.selected("suppliers", supplier_ids),
+        "category_options": choices.options("categories", category_ids),
+        "supplier_options": choices.options("suppliers", supplier_ids),
     })
 
 def delete_product(request:HttpRequest, id:int):
@@ -255,10 +223,6 @@ def delete_product(request:HttpRequest, id:int):
     product = models.Product.objects.get(pk=id)
 
     if product:
-        if product.image:
-            image_path = os.path.join(settings.MEDIA_ROOT, product.image.name)
-            if os.path.isfile(image_path):
-                os.remove(image_path)
         product.delete()
         messages.success(request,"Product deleted sucessfully !", 'bg-green-500')
         return redirect("main:products_view")
@@ -273,17 +237,19 @@ def categories_view(request:HttpRequest):
         messages.warning(request,"sorry ! you cannot access to previous page", "bg-orange-300")
         return redirect('main:home_view')    
     
-    if "searchcategory" in request.GET:
-        categories = models.Category.objects.filter(title__contains=request.GET["searchcategory"])
-    else:
-        categories = models.Category.objects.all()
+    def get_page():
+        categories = models.Category.objects.with_products_count()
+        if "searchcategory" in request.GET:
+            categories = search.search_categories(categories, request.GET["searchcategory"])
+            total = None
+        else:
+            total = counters.get_all()[counters.CATEGORIES]
 
-    paginator = Paginator(categories, 10) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        paginator = pagination.CursorPaginator(categories, search.ordering(categories, ('created_at', 'id')), 10, total)
+        return paginator.get_page(request)
 
     return render(request, "categories/categories.html",{
-        "categories": page_obj
+        "categories": SimpleLazyObject(get_page)
     })
 
 
@@ -379,17 +345,19 @@ def suppliers_view(request:HttpRequest):
         messages.warning(request,"sorry ! you cannot access to previous page", "bg-orange-300")
         return redirect('main:home_view')       
     
-    if "searchsupplier" in request.GET:
-        suppliers = models.Supplier.objects.filter(name__contains=request.GET["searchsupplier"])
-    else:
-        suppliers = models.Supplier.objects.all()
+    def get_page():
+        suppliers = models.Supplier.objects.with_products_count()
+        if "searchsupplier" in request.GET:
+            suppliers = search.search_suppliers(suppliers, request.GET["searchsupplier"])
+            total = None
+        else:
+            total = counters.get_all()[counters.SUPPLIERS]
 
-    paginator = Paginator(suppliers, 10) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        paginator = pagination.CursorPaginator(suppliers, search.ordering(suppliers, ('created_at', 'id')), 10, total)
+        return paginator.get_page(request)
 
     return render(request, "suppliers/home.html",{
-        "suppliers": page_obj
+        "suppliers": SimpleLazyObject(get_page)
     })
 
 
@@ -415,6 +383,8 @@ def add_supplier(request:HttpRequest):
                 phone=request.POST['phone']
             )
             new_supplier.save()
+            if request.FILES.get('logo'):
+                media.generate_variants(new_supplier.logo)
             messages.success(request,"Supplier added sucessfully !", 'bg-green-500')
             return redirect("main:suppliers_view")
      
@@ -432,7 +402,6 @@ def add_supplier(request:HttpRequest):
 
 
 def edit_supplier(request:HttpRequest, id:int):
-    print(request.user.get_all_permissions())
     if not request.user.is_authenticated:
         messages.warning(request,"sorry ! you must be logged in to access page", "bg-orange-300")
         return redirect('main:login_view')
@@ -453,15 +422,14 @@ def edit_supplier(request:HttpRequest, id:int):
         if form.is_valid():
             supplier.name = request.POST['name']
             if request.FILES.get('logo'):
-                image_path = os.path.join(settings.MEDIA_ROOT, supplier.logo.name)
-                if os.path.isfile(image_path):
-                    os.remove(image_path)
                 supplier.logo = request.FILES['logo']
                         
             supplier.email = request.POST['email']
             supplier.website = request.POST['website']
             supplier.phone = request.POST['phone']
             supplier.save()
+            if request.FILES.get('logo'):
+                media.generate_variants(supplier.logo)
             messages.success(request,"Supplier updated sucessfully !", 'bg-green-500')
             return redirect("main:suppliers_view")
      
@@ -484,9 +452,6 @@ def delete_supplier(request:HttpRequest, id:int):
         return redirect('main:home_view')    
 
     if supplier:
-        image_path = os.path.join(settings.MEDIA_ROOT, supplier.logo.name)
-        if os.path.isfile(image_path):
-            os.remove(image_path)
         supplier.delete()
         messages.success(request,"Supplier deleted sucessfully !", 'bg-green-500')
         return redirect("main:suppliers_view")
@@ -497,18 +462,19 @@ def users_view(request:HttpRequest):
         messages.warning(request,"sorry ! you must be logged in to access page", "bg-orange-300")
         return redirect('main:login_view')
 
+    total = None
     if request.user.has_perm('auth.view_user'):
         if "searchuser" in request.GET:
-            users = User.objects.filter(Q(first_name__contains=request.GET["searchuser"]) and Q(is_superuser=False))
+            users = User.objects.filter(Q(first_name__contains=request.GET["searchuser"]) & Q(is_superuser=False))
         else:
             users = User.objects.filter(is_superuser=False)
+            total = counters.get_all()[counters.USERS]
     else:
-        users = []
+        users = User.objects.none()
         messages.error(request,'Sorry ! you cannot access to this page !', 'bg-red-400')
 
-    paginator = Paginator(users, 10) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = pagination.CursorPaginator(users, ('date_joined', 'id'), 10, total)
+    page_obj = paginator.get_page(request)
 
     return render(request, "users/home.html",{
         "users": page_obj
@@ -548,11 +514,11 @@ def edit_user(request:HttpRequest, id:int):
     else:
         form = forms.EditUserForm()
 
-    groups = Group.objects.all()
     return render(request, "users/edit_user.html", {
         "form": form,
         "user":user,
-        "groups":groups
+        "groups":choices.group_choices(),
+        "user_group_ids":set(user.groups.values_list('id', flat=True)),
     })
 
 def delete_user(request:HttpRequest, id:int):
@@ -580,12 +546,10 @@ def add_user(request:HttpRequest):
         return redirect('main:home_view')       
     
     if request.method == "POST":
-        print(request.POST)
         form = forms.UserForm(request.POST, request.FILES)
 
         if request.POST['password'] != request.POST['confirm_password']:
             form.add_error('password', 'passwords not equals')
-        group = Group.objects.get(pk=request.POST['group'])
         if form.is_valid():
             new_user = User.objects.create_user(
             first_name = request.POST['first_name'],
@@ -595,7 +559,7 @@ def add_user(request:HttpRequest):
             password=request.POST['password'],
             )
             new_user.save()
-            new_user.groups.add(group)
+            new_user.groups.add(form.cleaned_data['group'])
             messages.success(request,"User added sucessfully !", 'bg-green-500')
             return redirect("main:users_view")
      
@@ -606,10 +570,9 @@ def add_user(request:HttpRequest):
         form = forms.UserForm()
 
 
-    groups = Group.objects.all()
     return render(request, "users/add_user.html", {
         "form": form,
-        "groups": groups
+        "groups": choices.group_choices()
     })
 
 
@@ -627,20 +590,13 @@ def supplier_products_view(request:HttpRequest,id:int):
     
     supplier = models.Supplier.objects.get(pk=id)
 
+    products = supplier.product_set.with_list_data()
     if "search" in request.GET:
-        products = supplier.product_set.filter(title__contains=request.GET["search"])
-    else:
-        products = supplier.product_set.all()
+        products = search.search_products(products, request.GET["search"])
 
-    today = localtime().date()
-
-    for product in products:
-        product.days_to_expire = (product.expire_date - today).days
-        
-        
-    paginator = Paginator(products, 10) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = pagination.CursorPaginator(products, search.ordering(products, ('created_at', 'id')), 10)
+    page_obj = paginator.get_page(request)
+    set_days_to_expire(page_obj)
 
     return render(request, "suppliers/supplier_products.html",{
         "products": page_obj,
@@ -661,14 +617,12 @@ def product_suppliers_view(request:HttpRequest, id:int):
     
 
     product = models.Product.objects.get(pk=id)
+    suppliers = product.suppliers.with_products_count()
     if "searchsupplier" in request.GET:
-        suppliers = product.suppliers.filter(name__contains=request.GET["searchsupplier"])
-    else:
-        suppliers = product.suppliers.all()
+        suppliers = search.search_suppliers(suppliers, request.GET["searchsupplier"])
 
-    paginator = Paginator(suppliers, 10) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = pagination.CursorPaginator(suppliers, search.ordering(suppliers, ('created_at', 'id')), 10)
+    page_obj = paginator.get_page(request)
 
     return render(request, "suppliers/home.html",{
         "suppliers": page_obj
@@ -691,42 +645,12 @@ def update_product_stock(request:HttpRequest, id:int):
 
     
     if request.method == "POST":
-            product.stock=request.POST['stock']
-            product.save()
-
-            # check stock to send email
-            managers = User.objects.filter(is_superuser=True).all()
-            if int(product.stock) <= 100:
-                try:
-                    content = f"""
-                    <html>
-                    <body>
-                        <div style="font-family: Arial, sans-serif; padding: 20px; border: 1px solid #ddd; border-radius: 5px;">
-                            <h2 style="color: #d9534f;">⚠️ Low Stock Alert</h2>
-                            <div style="background-color: #f9f9f9; padding: 15px; margin: 15px 0; border-left: 4px solid #d9534f;">
-                                <p><strong>Product:</strong> {product.title}</p>
-                                <p><strong>Current Stock:</strong> {product.stock} units</p>
-                                <p><strong>Date:</strong> {product.created_at.strftime('%Y-%m-%d')}</p>
-                                <p><strong>Status:</strong> reach minimum Stock (100 units)</p>
-                            </div>
-                            <p>Thank you
-                        </div>
-                    </body>
-                    </html>
-                    """
-                    for manager in managers:
-                        if manager.email:
-                            email = EmailMessage(
-                            "Low Stock Alert",
-                                content,
-                                settings.DEFAULT_FROM_EMAIL,
-                                [manager.email],
-                            )
-                            email.content_subtype = "html"
-                            email.send()
-                except Exception as e:
-                    print(e)
-
+            # applied as a locked relative change and recorded in the stock ledger, low stock alerts are queued by the stock module
+            try:
+                stock.apply_movements([stock.parse_movement({"product_id": product.id, "stock": exports.int_param(request.POST, 'stock')})], request.user)
+            except stock.StockError as e:
+                messages.warning(request, str(e), "bg-red-300")
+                return redirect("main:update_product_stock", product.id)
 
             messages.success(request,"Product stock updated sucessfully !", 'bg-green-500')
             return redirect("main:products_view")
@@ -752,31 +676,20 @@ def export_products(request:HttpRequest):
         messages.warning(request,"sorry ! you cannot access to previous page", "bg-orange-300")
         return redirect('main:home_view')
     
-    response = HttpResponse(
+    rows = exports.export_products(request.GET)
+
+    if request.GET.get('format') == 'gz':
+        return StreamingHttpResponse(
+            exports.gzip_stream(rows),
+            content_type='application/gzip',
+            headers={'Content-Disposition': 'attachment; filename="products.csv.gz"'},
+        )
+
+    return StreamingHttpResponse(
+        rows,
         content_type='text/csv',
         headers={'Content-Disposition': 'attachment; filename="products.csv"'},
     )
-    
-    writer = csv.writer(response)
-    
-    writer.writerow(['ID', 'Title', 'Description', 'Price', 'Stock', 'Expire Date', 'Category', '#Suppliers'])
-    
-    products = models.Product.objects.all()
-    
-    for product in products:
-        suppliers = product.suppliers.count()
-        writer.writerow([
-            product.id,
-            product.title,
-            product.description,
-            product.price,
-            product.stock,
-            product.expire_date.strftime('%Y-%m-%d'),
-            product.Category.title,
-            suppliers
-        ])
-    
-    return response
 
 def import_csv(request:HttpRequest):
     if not request.user.is_authenticated:
@@ -794,44 +707,157 @@ def import_csv(request:HttpRequest):
             messages.error(request, "This file is not a CSV file", "bg-red-500")
             return redirect('main:import_csv')
         
-        try:
-            file_data = csv_file.read().decode('utf-8')
-            csv_data = csv.reader(file_data.splitlines())
-            
-            next(csv_data, None)
-            
-            products_added = 0
-            for row in csv_data:
-                if len(row) >= 6: 
-                    title = row[1]
-                    description = row[2]
-                    price = float(row[3])
-                    stock = int(row[4])
-                    expire_date = row[5]
-                    category_name = row[6]
-
-                    expire_date = datetime.strptime(row[5], "%Y-%m-%d").date()
-                
-                    category = models.Category.objects.filter(title=category_name).first()
-                    if not category:
-                        category = models.Category(title=category_name)
-                        category.save()
-
-                    product = models.Product(
-                        title=title,
-                        description=description,
-                        price=price,
-                        stock=stock,
-                        expire_date=expire_date,
-                        Category=category
-                    )
-                    product.save()
-                    products_added += 1
-                    
-            messages.success(request, f"{products_added} products imported successfully!", "bg-green-500")
-            return redirect('main:products_view')
-            
-        except Exception as e:
-            messages.error(request, f"Error importing CSV: {str(e)}", "bg-red-500")
+        # the run_import_jobs worker processes the file off the request thread
+        mode = request.POST.get('mode', models.ImportJob.MODE_CREATE)
+        if mode not in dict(models.ImportJob.MODE_CHOICES):
+            messages.error(request, "Unknown import mode", "bg-red-500")
+            return redirect('main:import_csv')
+
+        job = models.ImportJob(file=csv_file, mode=mode, created_by=request.user)
+        job.save()
+        messages.success(request, "CSV uploaded, the import is running in the background", "bg-green-500")
+        return redirect('main:import_job_view', id=job.id)
     
-    return render(request, "import_csv.html")
\ No newline at end of file
+    return render(request, "import_csv.html", {
+        "modes": models.ImportJob.MODE_CHOICES,
+    })
+
+
+def import_job_view(request:HttpRequest, id:int):
+    if not request.user.is_authenticated:
+        messages.warning(request,"sorry ! you must be logged in to access page", "bg-orange-300")
+        return redirect('main:login_view')
+    
+    if not request.user.has_perm('main.add_product'):
+        messages.warning(request,"sorry ! you cannot access to previous page", "bg-orange-300")
+        return redirect('main:home_view')
+
+    job = models.ImportJob.objects.filter(pk=id).first()
+    if not job:
+        messages.warning(request,"sorry ! the enetred import not exists", "bg-red-300")
+        return redirect('main:import_csv')
+
+    return render(request, "import_job.html", {
+        "job": job,
+    })
+
+
+def import_job_status(request:HttpRequest, id:int):
+    if not request.user.is_authenticated or not request.user.has_perm('main.add_product'):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    job = models.ImportJob.objects.filter(pk=id).first()
+    if not job:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    return JsonResponse({
+        "id": job.id,
+        "status": job.status,
+        "finished": job.is_finished,
+        "rows_processed": job.rows_processed,
+        "rows_created": job.rows_created,
+        "rows_updated": job.rows_updated,
+        "rows_failed": job.rows_failed,
+        "rows_per_second": job.rows_per_second(),
+        "errors": job.errors.splitlines(),
+    })
+
+
+@require_POST
+def stock_movements(request:HttpRequest):
+    if not request.user.is_authenticated or not request.user.has_perm('main.update_stock'):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "invalid JSON"}, status=400)
+    if not isinstance(data, dict) or not isinstance(data.get("movements"), list):
+        return JsonResponse({"error": 'expected {"movements": [...]}'}, status=400)
+
+    # all or nothing, one invalid movement rolls back the whole batch
+    try:
+        ledger = stock.apply_movements([stock.parse_movement(movement) for movement in data["movements"]], request.user)
+    except stock.StockError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "movements": [
+            {
+                "product_id": movement.product_id,
+                "kind": movement.kind,
+                "delta": movement.delta,
+                "stock": movement.stock_after,
+            }
+            for movement in ledger
+        ],
+    })
+
+
+@require_POST
+def bulk_update_stock(request:HttpRequest):
+    if not request.user.is_authenticated or not request.user.has_perm('main.update_stock'):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "invalid JSON"}, status=400)
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return JsonResponse({"error": 'expected [...] or {"items": [...]}'}, status=400)
+
+    try:
+        results = stock.apply_bulk(items, request.user)
+    except stock.StockError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    failed = sum(1 for result in results if not result["ok"])
+    return JsonResponse({
+        "applied": sum(1 for result in results if result.get("applied")),
+        "failed": failed,
+        "results": results,
+    }, status=400 if failed else 200)
+
+
+def stock_history(request:HttpRequest, id:int):
+    if not request.user.is_authenticated or not request.user.has_perm('main.view_stock'):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    period = request.GET.get("period", models.StockRollup.PERIOD_DAY)
+    if period not in dict(models.StockRollup.PERIOD_CHOICES):
+        return JsonResponse({"error": "period must be day or week"}, status=400)
+    days = request.GET.get("days", "365")
+    if not days.isdigit():
+        return JsonResponse({"error": "days must be a number"}, status=400)
+
+    since = localtime().date() - timedelta(days=min(int(days), 3660))
+    return JsonResponse({
+        "product_id": int(id),
+        "period": period,
+        "history": [
+            {**row, "net_change": row["stock_in"] - row["stock_out"]}
+            for row in rollups.history(since, period, product_id=id)
+        ],
+    })
+
+
+def cache_stats(request:HttpRequest):
+    if not request.user.is_authenticated or not request.user.is_superuser:
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    # counters are per process, each worker reports its own
+    return JsonResponse({
+        "pid": os.getpid(),
+        "backend": settings.CACHES["default"]["BACKEND"],
+        **caching.stats(),
+    })
+
+
+def choice_options(request:HttpRequest, kind:str):
+    if not request.user.is_authenticated or not (request.user.has_perm('main.add_product') or request.user.has_perm('main.change_product')):
+        return JsonResponse({"error": "not allowed"}, status=403)
+    if kind not in choices.SOURCES:
+        return JsonResponse({"error": "unknown choice list"}, status=404)
+
+    return JsonResponse({"results": choices.typeahead(kind, request.GET.get("q", ""))})